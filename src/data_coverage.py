@@ -0,0 +1,268 @@
+#!/usr/bin/python3
+
+"""
+    This file contains functions that summarize which periods of the data
+    are populated. The summary is calculated in one pass through the data
+    and wrapped into a namedtuple so that plotting functions can skip empty
+    or insufficient periods before selecting any data.
+
+    Author: Howard Cheung (howard.at@gmail.com)
+    Date: 2017/03/25
+"""
+
+# import python internal libraries
+import calendar
+from collections import namedtuple
+from datetime import date
+import os
+
+# import third party libraries
+from numpy import arange, where
+import pandas as pd
+
+# import user-defined libraries
+from data_read import local_index
+
+
+# global variables
+Coverage = namedtuple('Coverage', ['months', 'slots', 'rows'])
+
+
+# write functions
+def day_type_keys(index: pd.DatetimeIndex) -> pd.Index:
+    """
+        This function returns the day type of each time stamp in the index.
+        'wkdy' for weekdays, 'sat' for Saturdays and 'sun' for Sundays.
+
+        Inputs:
+        ==========
+        index: pd.DatetimeIndex
+            time stamps of the data
+    """
+
+    weekday = index.weekday
+    return pd.Index(
+        where(weekday <= 4, 'wkdy', where(weekday == 5, 'sat', 'sun')),
+        name='DayType'
+    )
+
+
+def cal_coverage(df: pd.DataFrame) -> Coverage:
+    """
+        This function calculates the coverage of the data and returns a
+        Coverage namedtuple with the fields
+
+        months: pd.DataFrame
+            indexed by ('Year', 'Month') of the populated months only, with
+            'Count' as the number of data points, 'First' and 'Last' as the
+            first and last time stamps and 'Complete' as whether the data
+            start on the first day and end on the last day of the month
+
+        slots: pd.Series
+            number of data points indexed by ('Year', 'Month', 'DayType',
+            'Slot') where 'Slot' is the datetime.time of the time stamps
+
+        rows: pd.DataFrame
+            indexed by ('Year', 'Month') of the populated months only, with
+            'Start' and 'Stop' as the positions of the first row and after
+            the last row of the data of the month so that the data of the
+            month can be selected from df.iloc[start:stop] only
+
+        Inputs:
+        ==========
+        df: pandas DataFrame
+            data with datetime object as its index
+    """
+
+    # use local time for the keys and the original time stamps for the
+    # first and last time stamps
+    index = local_index(df.index)
+    year = pd.Index(index.year, name='Year')
+    month = pd.Index(index.month, name='Month')
+
+    # summary of each populated month
+    months = pd.Series(df.index, index=df.index).groupby(
+        [year, month]
+    ).agg(['count', 'min', 'max'])
+    months.columns = ['Count', 'First', 'Last']
+    months['Complete'] = [
+        first.date() == date(yr, mn, 1) and
+        last.date() == date(yr, mn, calendar.monthrange(yr, mn)[1])
+        for (yr, mn), first, last in zip(
+            months.index, months['First'], months['Last']
+        )
+    ]
+
+    # number of samples per time slot of each day type
+    slots = pd.Series(1, index=index).groupby([
+        year, month, day_type_keys(index),
+        pd.Index(index.time, name='Slot')
+    ]).size()
+
+    # positions of the rows of each month
+    positions = pd.Series(arange(len(df)), index=df.index).groupby(
+        [year, month]
+    ).agg(['min', 'max'])
+    rows = pd.DataFrame({
+        'Start': positions['min'], 'Stop': positions['max']+1
+    })
+
+    return Coverage(months, slots, rows)
+
+
+def year_complete(coverage: Coverage, yr: int) -> bool:
+    """
+        This function checks if the data start on the first day and end on
+        the last day of the year
+
+        Inputs:
+        ==========
+        coverage: Coverage
+            coverage of the data calculated by cal_coverage
+
+        yr: int
+            year to be checked
+    """
+
+    months = coverage.months
+    if (yr, 1) not in months.index or (yr, 12) not in months.index:
+        return False
+    return months.loc[(yr, 1), 'First'].date() == date(yr, 1, 1) and \
+        months.loc[(yr, 12), 'Last'].date() == date(yr, 12, 31)
+
+
+def period_rows(coverage: Coverage, yr: int, mn: int=None) -> tuple:
+    """
+        This function returns a tuple of the positions of the first row and
+        after the last row of the data in a month, or a year if mn is None,
+        for selecting the data with df.iloc[start:stop]. The selected rows
+        are all the rows of the period if the data are sorted in time.
+
+        Inputs:
+        ==========
+        coverage: Coverage
+            coverage of the data calculated by cal_coverage
+
+        yr: int
+            year of the period
+
+        mn: int
+            month of the period. Default None for the entire year
+    """
+
+    if mn is None:
+        rows = coverage.rows.loc[yr]
+        return int(rows['Start'].min()), int(rows['Stop'].max())
+    return int(coverage.rows.loc[(yr, mn), 'Start']), \
+        int(coverage.rows.loc[(yr, mn), 'Stop'])
+
+
+def slot_count(coverage: Coverage, yr: int, mn: int, load_type: str,
+               slot) -> int:
+    """
+        This function returns the number of data points in a time slot of
+        a day type in the specified month. Zero if there is no data.
+
+        Inputs:
+        ==========
+        coverage: Coverage
+            coverage of the data calculated by cal_coverage
+
+        yr: int
+            year of the time slot
+
+        mn: int
+            month of the time slot
+
+        load_type: str
+            day type. 'wkdy', 'sat' or 'sun'
+
+        slot: datetime.time
+            time of the time slot
+    """
+
+    try:
+        return int(coverage.slots.loc[(yr, mn, load_type, slot)])
+    except KeyError:
+        return 0
+
+
+def export_coverage(coverage: Coverage, filename: str):
+    """
+        This function saves the coverage report. For xlsx files, the
+        monthly summary and the slot counts are saved in the sheets 'months'
+        and 'slots', with the first and last time stamps in local time
+        without the time zone because Excel does not support time zones.
+        For csv files, the monthly summary is saved in filename and the slot
+        counts in a file with '-slots' appended to the name.
+
+        Inputs:
+        ==========
+        coverage: Coverage
+            coverage of the data calculated by cal_coverage
+
+        filename: string
+            path to the report file
+    """
+
+    root, ext = os.path.splitext(filename)
+    slots = coverage.slots.rename('Count').to_frame()
+    if ext == '.xlsx' or ext == '.xls':
+        months = coverage.months.copy()
+        for col in ['First', 'Last']:
+            if months[col].dt.tz is not None:
+                months[col] = months[col].dt.tz_localize(None)
+        with pd.ExcelWriter(filename) as xlsx:
+            months.to_excel(xlsx, sheet_name='months')
+            slots.to_excel(xlsx, sheet_name='slots')
+    elif ext == '.csv':
+        coverage.months.to_csv(filename)
+        slots.to_csv(''.join([root, '-slots', ext]))
+    else:
+        raise ValueError(''.join([
+            'The file extension of the report file cannot be recognized by ',
+            'data_coverage.export_coverage(). Exiting.......'
+        ]))
+
+
+# testing functions
+if __name__ == '__main__':
+
+    from datetime import time
+    from pathlib import Path
+    import tempfile
+
+    from test_files import load_test_data
+
+    PDDF = load_test_data()
+    COVERAGE = cal_coverage(PDDF)
+    assert (2014, 12) in COVERAGE.months.index
+    assert not COVERAGE.months.loc[(2014, 12), 'Complete']
+    assert COVERAGE.months.loc[(2015, 1), 'Complete']
+    assert COVERAGE.months['Count'].sum() == len(PDDF)
+    assert COVERAGE.slots.sum() == len(PDDF)
+    assert year_complete(COVERAGE, 2015)
+    assert not year_complete(COVERAGE, 2014)
+    assert not year_complete(COVERAGE, 2016)
+    assert slot_count(COVERAGE, 2015, 1, 'wkdy', time(0, 0)) == 22
+    assert slot_count(COVERAGE, 2013, 1, 'wkdy', time(0, 0)) == 0
+    START, STOP = period_rows(COVERAGE, 2015, 1)
+    assert (local_index(PDDF.index[START:STOP]).month == 1).all()
+    assert STOP-START == COVERAGE.months.loc[(2015, 1), 'Count']
+    assert period_rows(COVERAGE, 2015) == (
+        period_rows(COVERAGE, 2015, 1)[0], period_rows(COVERAGE, 2015, 12)[1]
+    )
+    with tempfile.TemporaryDirectory() as TMPDIR:
+        export_coverage(COVERAGE, os.path.join(TMPDIR, 'coverage.csv'))
+        assert Path(TMPDIR, 'coverage.csv').exists()
+        assert Path(TMPDIR, 'coverage-slots.csv').exists()
+        # time stamps of the test data are time zone aware
+        export_coverage(COVERAGE, os.path.join(TMPDIR, 'coverage.xlsx'))
+        assert pd.read_excel(
+            os.path.join(TMPDIR, 'coverage.xlsx'), sheet_name='months'
+        )['Count'].sum() == len(PDDF)
+        assert pd.read_excel(
+            os.path.join(TMPDIR, 'coverage.xlsx'), sheet_name='slots'
+        )['Count'].sum() == len(PDDF)
+
+    print('All functions in', os.path.basename(__file__), 'are ok')
@@ -9,20 +9,35 @@
 """
 
 # import python internal libraries
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from math import isnan
 import os
 
 # import third party libraries
-from numpy import where
+from numpy import asarray, concatenate, empty, flatnonzero, full, inf, \
+    isnan as isnull, minimum, nan, ndarray, where
 import pandas as pd
+from pandas.api.types import is_numeric_dtype
 
 # import user-defined libraries
 
 
+# global variables
+SENTINELS = ['Bad', '---']  # tokens of invalid readings in BMS exports
+BLOCK_SIZE = 65536  # number of readings parsed at a time by coerce_numeric
+ZONE_OFFSETS = {  # UTC offsets in hours of zone suffixes of time stamps
+    'UTC': 0, 'GMT': 0, 'EST': -5, 'EDT': -4, 'CST': -6, 'CDT': -5,
+    'MST': -7, 'MDT': -6, 'PST': -8, 'PDT': -7
+}
+
+
 # write functions
 def read_data(filename: str, header: int=None,
-              time_format: str='%m/%d/%y %I:%M:%S %p CST') -> pd.DataFrame:
+              time_format: str='%m/%d/%y %I:%M:%S %p %Z', tz: str=None,
+              ambiguous: str='infer', nonexistent: str='shift_forward',
+              sentinels: list=SENTINELS, thousands: str=None,
+              decimal: str='.', outage_ratio: float=4.0,
+              token_counts: dict=None) -> pd.DataFrame:
     """
         This function reads the data in filename that is in specified format
         and returns a pandas dataframe with time data as the index and
@@ -41,9 +56,56 @@ def read_data(filename: str, header: int=None,
             will be combined into a MultiIndex. Default None
 
         time_format: string
-            format of string in time. Default '%m/%d/%y %I:%M:%S %p CST'
+            format of string in time. Default '%m/%d/%y %I:%M:%S %p %Z'
             Please check https://docs.python.org/3.5/library/datetime.html#strftime-and-strptime-behavior
-            for details
+            for details. A trailing %Z is a zone suffix in ZONE_OFFSETS
+            after the last space of the time stamps, e.g. 'CST', that is
+            converted to its UTC offset
+
+        tz: string
+            time zone of the time stamps in the data file, e.g.
+            'America/Chicago'. The index of the dataframe is in the time
+            zone and its values are stored in UTC so that time stamps around
+            daylight saving time transitions stay unique and ordered. Time
+            stamps with zone suffixes are converted to the time zone.
+            Otherwise, they are localized to the time zone. Use
+            local_index() to obtain the local time of the index. Default
+            None to use the UTC offset of the zone suffixes, or to keep
+            time stamps without zone suffixes without time zone
+
+        ambiguous: string
+            policy for ambiguous local times at the end of daylight saving
+            time when time stamps without zone suffixes are localized.
+            'infer' to infer from the order of the data and drop them if
+            the data do not have the repeated hour, 'NaT' to drop them and
+            'raise' to raise an error. Default 'infer'
+
+        nonexistent: string
+            policy for nonexistent local times at the start of daylight
+            saving time. 'shift_forward' or 'shift_backward' to move them to
+            the closest existing time, 'NaT' to drop them and 'raise' to
+            raise an error. Default 'shift_forward'
+
+        sentinels: list of str
+            tokens in the cooling load column that mark invalid readings.
+            Default ['Bad', '---']
+
+        thousands: str
+            thousands separator of the readings in text. Default None to
+            use '.' if decimal is ',' and ',' otherwise
+
+        decimal: str
+            decimal point of the readings in text. Default '.'
+
+        outage_ratio: float
+            gaps between time stamps longer than outage_ratio times the
+            sampling interval next to them are outages that are not
+            counted in the durations of the data points. Default 4.0
+
+        token_counts: dict
+            if given, it is updated with the number of occurrence of each
+            token in the cooling load column that is not a number. Default
+            None
     """
 
     # initialize the dataframe
@@ -67,11 +129,18 @@ def read_data(filename: str, header: int=None,
         ]))
 
     # make time column as the index
-    pddf.loc[:, 'Time'] = [
-        datetime.strptime(timestr, time_format)
-        for timestr in pddf.loc[:, 'Time']
-    ]
-    pddf.set_index('Time', inplace=True)
+    timeind = parse_times(
+        pddf['Time'], time_format, tz, ambiguous, nonexistent
+    )
+    pddf = pddf.loc[:, ['CLG']].set_index(timeind)
+    # drop ambiguous or nonexistent time stamps if required by the policies
+    pddf = pddf.loc[pddf.index.notnull(), :]
+
+    # convert the readings to float before removing the outliers
+    clg, counts = coerce_numeric(pddf['CLG'], sentinels, thousands, decimal)
+    pddf = pddf.assign(CLG=clg)
+    if token_counts is not None:
+        token_counts.update(counts)
 
     # invalidate extereme outliers
     outlier_thres = pddf['CLG'].mean()+6*pddf['CLG'].std()
@@ -81,14 +150,74 @@ def read_data(filename: str, header: int=None,
     pddf.loc[:, 'CLG'] = check_nan(pddf['CLG'])
 
     # calculate the duration of each data point
-    pddf.loc[:, 'Duration'] = [
-        cal_each_duration(ind, timeind, pddf['CLG'])
-        for ind, timeind in enumerate(pddf['CLG'].index)
-    ]
+    pddf.loc[:, 'Duration'] = cal_durations(pddf.index, outage_ratio)
 
     return pddf
 
 
+def parse_times(times: pd.Series,
+                time_format: str='%m/%d/%y %I:%M:%S %p %Z', tz: str=None,
+                ambiguous: str='infer',
+                nonexistent: str='shift_forward') -> pd.DatetimeIndex:
+    """
+        This function converts the time stamps in text to a DatetimeIndex
+        named 'Time' with vectorized operations. Inputs other than times are
+        the same as read_data().
+
+        Inputs:
+        ==========
+        times: pd.Series
+            time stamps in text
+    """
+
+    if not time_format.endswith('%Z'):
+        timeind = pd.DatetimeIndex(
+            pd.to_datetime(times, format=time_format), name='Time'
+        )
+        if tz is None:
+            return timeind
+        try:
+            return timeind.tz_localize(
+                tz, ambiguous=ambiguous, nonexistent=nonexistent
+            )
+        except ValueError:
+            if ambiguous != 'infer':
+                raise
+            # the data do not have the repeated hour to infer from
+            return timeind.tz_localize(
+                tz, ambiguous='NaT', nonexistent=nonexistent
+            )
+
+    # parse the time stamps of each zone suffix after the last space with
+    # the suffix as a literal and convert them to UTC
+    stamps = times.astype(str).str.strip()
+    zones = stamps.str.rpartition(' ')[2]
+    unique_zones = list(zones.unique())
+    for zone in unique_zones:
+        if zone not in ZONE_OFFSETS:
+            raise ValueError(''.join([
+                'The zone suffix ', zone, ' of the time stamps cannot be ',
+                'recognized by data_read.parse_times(). Exiting.......'
+            ]))
+    timeind = pd.DatetimeIndex(pd.concat([
+        pd.to_datetime(
+            stamps if len(unique_zones) == 1 else stamps[zones == zone],
+            format=''.join([time_format[:-2], zone])
+        )-pd.Timedelta(hours=ZONE_OFFSETS[zone])
+        for zone in unique_zones
+    ]).reindex(stamps.index), name='Time').tz_localize('UTC')
+    if tz is None:
+        if len(unique_zones) > 1:
+            raise ValueError(''.join([
+                'The time stamps have different zone suffixes and tz is ',
+                'required by data_read.parse_times(). Exiting.......'
+            ]))
+        tz = timezone(
+            timedelta(hours=ZONE_OFFSETS[unique_zones[0]]), unique_zones[0]
+        )
+    return timeind.tz_convert(tz)
+
+
 def interpolate_with_s(mid_date: datetime, a_date: datetime, b_date: datetime,
                        a_value: float, b_value: float) -> float:
     """
@@ -113,11 +242,127 @@ def interpolate_with_s(mid_date: datetime, a_date: datetime, b_date: datetime,
             value b
     """
 
-    return (b_value-a_value)*(mid_date-a_date).seconds /\
-        (b_date-a_date).seconds+a_value
+    return (b_value-a_value)*(mid_date-a_date).total_seconds() /\
+        (b_date-a_date).total_seconds()+a_value
+
+
+def coerce_numeric(wseries: pd.Series, sentinels: list=SENTINELS,
+                   thousands: str=None, decimal: str='.') -> tuple:
+    """
+        This function converts the values inside the series to float with
+        vectorized operations. Numbers in text with thousands separators and
+        decimal points are parsed, while sentinel tokens and other text are
+        converted to nan. Returns a tuple of the pd.Series in float and a
+        dictionary of the number of occurrence of each token converted to
+        nan.
+
+        The values are parsed in blocks of BLOCK_SIZE rows. Only the
+        blocks that cannot be parsed directly are cleaned of the thousands
+        separators and the decimal points with vectorized string
+        operations, and only the blocks with text that still cannot be
+        parsed are parsed by pd.to_numeric.
+
+        Inputs:
+        ==========
+        wseries: pd.Series
+            pandas Series data with values in float or str
+
+        sentinels: list of str
+            tokens that mark invalid readings. They are converted to nan
+            even if they are numbers, e.g. '-9999'. Default ['Bad', '---']
+
+        thousands: str
+            thousands separator of the numbers in text. Default None to use
+            '.' if decimal is ',' and ',' otherwise
+
+        decimal: str
+            decimal point of the numbers in text. Default '.'
+    """
+
+    if thousands is None:
+        thousands = '.' if decimal == ',' else ','
+    if thousands == decimal:
+        raise ValueError(''.join([
+            'The thousands separator and the decimal point are the same ',
+            'and the numbers cannot be recognized by ',
+            'data_read.coerce_numeric(). Exiting.......'
+        ]))
+
+    counts = {}
+    if is_numeric_dtype(wseries.dtype):
+        values = wseries.to_numpy(dtype=float, copy=True)
+    else:
+        # sentinel tokens in text
+        is_sentinel = wseries.isin(sentinels).to_numpy()
+        for token, count in wseries[is_sentinel].value_counts().items():
+            counts[token] = int(count)
+        valid = flatnonzero(~is_sentinel)
+        raw = asarray(wseries, dtype=object)[valid]
+
+        # the decimal point may be parsed as a thousands separator if it is
+        # not '.' and all text has to be cleaned before parsing
+        direct = decimal == '.' and thousands != '.'
+        # columns of text may have numbers that are not text only if they
+        # are of object dtype
+        mixed = wseries.dtype == object
+        parsed = empty(len(raw))
+        failed = []
+        for start in range(0, len(raw), BLOCK_SIZE):
+            block = raw[start:start+BLOCK_SIZE]
+            if direct:
+                try:
+                    parsed[start:start+BLOCK_SIZE] = block.astype(float)
+                    continue
+                except (TypeError, ValueError):
+                    pass
+            cells = pd.Series(block, dtype=object)
+            text = cells.str.replace(thousands, '', regex=False) \
+                if thousands else cells
+            if decimal != '.':
+                text = text.str.replace(decimal, '.', regex=False)
+            if mixed:  # numbers that are not text are kept as they are
+                text = text.where(text.notnull(), cells)
+            block = text.to_numpy(dtype=object)
+            try:
+                parsed[start:start+BLOCK_SIZE] = block.astype(float)
+            except (TypeError, ValueError):  # text that is not a number
+                part = pd.to_numeric(
+                    pd.Series(block), errors='coerce'
+                ).to_numpy(dtype=float)
+                parsed[start:start+BLOCK_SIZE] = part
+                failed.append(start+flatnonzero(
+                    isnull(part) & pd.notnull(block)
+                ))
+        values = full(len(wseries), nan)
+        values[valid] = parsed
+
+        # text that is not a number
+        if failed:
+            text = pd.Series(raw[concatenate(failed)]).astype(str).str.strip()
+            for token, count in text.value_counts().items():
+                counts[token] = counts.get(token, 0)+int(count)
+
+    # sentinels that are numbers, e.g. -9999
+    num_sentinels = {}
+    for token in sentinels:
+        try:
+            num_sentinels[float(token)] = token
+        except ValueError:
+            continue
+    if num_sentinels:
+        is_sentinel = pd.Series(values).isin(list(num_sentinels)).to_numpy()
+        for val, count in pd.Series(
+            values[is_sentinel]
+        ).value_counts().items():
+            token = num_sentinels[val]
+            counts[token] = counts.get(token, 0)+int(count)
+        values[is_sentinel] = nan
+
+    return pd.Series(values, index=wseries.index, name=wseries.name), counts
 
 
-def check_nan(wseries: pd.Series) -> pd.Series:
+def check_nan(wseries: pd.Series, sentinels: list=SENTINELS,
+              thousands: str=None, decimal: str='.') -> pd.Series:
     """
         This function checks the values inside the series. If any of them
         are nan or str, user interpolation with adjacent values to
@@ -128,64 +373,59 @@ def check_nan(wseries: pd.Series) -> pd.Series:
         wseries: pd.Series
             pandas Series data with values in float and index as
             datetime.datetime object
-    """
 
-    if len(wseries[pd.Series([
-        (type(val) == str or isnan(val)) for val in wseries
-    ], index=wseries.index)]) == 0:
-        return wseries  # nothing to change
+        sentinels: list of str
+            tokens that mark invalid readings. Default ['Bad', '---']
 
-    # ensure that all are either float or nan
-    def _float_or_nan(ent):
-        """
-            Force values to be either a float or nan first
-        """
-        try:
-            return float(ent)
-        except ValueError:
-            return float('nan')
+        thousands: str
+            thousands separator of the numbers in text. Default None to use
+            '.' if decimal is ',' and ',' otherwise
 
-    wseries = pd.Series(
-        [_float_or_nan(val) for val in wseries], index=wseries.index,
-        name=wseries.name
-    )
+        decimal: str
+            decimal point of the numbers in text. Default '.'
+    """
+
+    # ensure that all are either float or nan. Readings converted by
+    # read_data() are not converted again
+    if is_numeric_dtype(wseries.dtype):
+        wseries = wseries.astype(float)
+    else:
+        wseries = coerce_numeric(wseries, sentinels, thousands, decimal)[0]
+
+    # locate the position of the problematic readings
+    inds = flatnonzero(wseries.isnull().to_numpy())
+    if len(inds) == 0:
+        return wseries  # nothing to change
 
     # continue with interpolation or extrapolation if needed
-    inds = where(
-        pd.Series([
-            (isinstance(val, str) or isnan(val)) for val in wseries
-        ], index=wseries.index)
-    )[0]  # locate the position of the problematic readings
     for ind in inds:
         try:
-            wseries[ind] = interpolate_with_s(
+            wseries.iloc[ind] = interpolate_with_s(
                 wseries.index[ind], wseries.index[ind-1],
                 wseries.index[ind+1],
-                wseries[ind-1], wseries[ind+1]
+                wseries.iloc[ind-1], wseries.iloc[ind+1]
             )
-            if isnan(wseries[ind]):  # interpolation does not work
-                wseries[ind] = interpolate_with_s(
+            if isnan(wseries.iloc[ind]):  # interpolation does not work
+                wseries.iloc[ind] = interpolate_with_s(
                     wseries.index[ind], wseries.index[ind-2],
                     wseries.index[ind-1],
-                    wseries[ind-2], wseries[ind-1]
+                    wseries.iloc[ind-2], wseries.iloc[ind-1]
                 )
         except IndexError:  # extrapolation
             try:
-                wseries[ind] = interpolate_with_s(
+                wseries.iloc[ind] = interpolate_with_s(
                     wseries.index[ind], wseries.index[ind-2],
                     wseries.index[ind-1],
-                    wseries[ind-2], wseries[ind-1]
+                    wseries.iloc[ind-2], wseries.iloc[ind-1]
                 )
             except IndexError:
-                wseries[ind] = interpolate_with_s(
+                wseries.iloc[ind] = interpolate_with_s(
                     wseries.index[ind], wseries.index[ind+2],
                     wseries.index[ind+1],
-                    wseries[ind+2], wseries[ind+1]
+                    wseries.iloc[ind+2], wseries.iloc[ind+1]
                 )
     return wseries
 
-    return wseries
-
 
 def cal_each_duration(ind: int, timeind: pd.tslib.Timestamp,
                       wseries: pd.Series) -> float:
@@ -215,6 +455,59 @@ def cal_each_duration(ind: int, timeind: pd.tslib.Timestamp,
         return ((wseries.index[ind+1]-wseries.index[ind-1]).seconds)/2.0
 
 
+def cal_durations(timeind: pd.DatetimeIndex,
+                  outage_ratio: float=4.0) -> ndarray:
+    """
+        This function calculates the duration of all data points in the
+        time series at once. Each data point lasts for half of the gaps to
+        the previous and the next data points, or the whole gap for the
+        first and the last data points.
+
+        A gap longer than outage_ratio times the shorter of the gaps next
+        to it is an outage, e.g. of days or years, and is counted as the
+        shorter gap so that the data points next to the outage do not
+        represent the whole outage. Changes of the sampling interval are
+        kept as they are. Negative gaps from repeated local hours in time
+        stamps without time zone are counted as zero.
+
+        Inputs:
+        ==========
+        timeind: pd.DatetimeIndex
+            time stamps of the time series
+
+        outage_ratio: float
+            ratio of a gap to the sampling interval next to it above which
+            the gap is an outage. Default 4.0
+    """
+
+    gaps = asarray((timeind[1:]-timeind[:-1]).total_seconds()).clip(0.0)
+    # sampling interval next to each gap from the positive gaps only
+    positive = where(gaps > 0.0, gaps, inf)
+    local = minimum(
+        concatenate([[inf], positive[:-1]]), concatenate([positive[1:], [inf]])
+    )
+    gaps = where(gaps > outage_ratio*local, local, gaps)
+    return concatenate([gaps[:1], (gaps[:-1]+gaps[1:])/2.0, gaps[-1:]])
+
+
+def local_index(timeind: pd.DatetimeIndex) -> pd.DatetimeIndex:
+    """
+        This function returns the local time of the time stamps without
+        the time zone so that keys like month, weekday and time of day can
+        be calculated in bulk. Time stamps without time zone are returned
+        directly.
+
+        Inputs:
+        ==========
+        timeind: pd.DatetimeIndex
+            time stamps of the time series
+    """
+
+    if timeind.tz is None:
+        return timeind
+    return timeind.tz_localize(None)
+
+
 # testing functions
 if __name__ == '__main__':
 
@@ -233,4 +526,107 @@ if __name__ == '__main__':
         assert TEST_DF.loc[TEST_DF.index[2], 'Duration'] == 60*30
         assert TEST_DF.loc[TEST_DF.index[-1], 'Duration'] == 60*30
 
+    # testing the conversion of messy readings
+    TEST_SERIES, TEST_COUNTS = coerce_numeric(pd.Series([
+        1.5, '1,234.5', ' 2 ', 'Bad', '---', 'Bad', 'abc', '-9999',
+        float('nan')
+    ]), sentinels=['Bad', '---', '-9999'])
+    assert TEST_SERIES[:3].tolist() == [1.5, 1234.5, 2.0]
+    assert TEST_SERIES[3:].isnull().all()
+    assert TEST_COUNTS == {'Bad': 2, '---': 1, 'abc': 1, '-9999': 1}
+    TEST_SERIES, TEST_COUNTS = coerce_numeric(
+        pd.Series(['1.234,5', 'Bad', 3]), thousands='.', decimal=','
+    )
+    assert TEST_SERIES.tolist()[::2] == [1234.5, 3.0]
+    assert TEST_COUNTS == {'Bad': 1}
+    # the thousands separator follows the decimal point by default
+    assert coerce_numeric(
+        pd.Series(['1,5', '2,25']), decimal=','
+    )[0].tolist() == [1.5, 2.25]
+    try:
+        coerce_numeric(pd.Series(['1,5']), thousands=',', decimal=',')
+        raise AssertionError('same thousands separator and decimal point')
+    except ValueError:
+        pass
+
+    # testing the interpolation and extrapolation of invalid readings
+    assert check_nan(pd.Series(
+        [1.0, float('nan'), 3.0, 'Bad', 5.0, float('nan')],
+        index=pd.date_range('2015-01-01', periods=6, freq='30min')
+    )).tolist() == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+
+    # testing time zone localization around daylight saving time
+    import tempfile
+    with tempfile.TemporaryDirectory() as TMPDIR:
+        TESTFILE = os.path.join(TMPDIR, 'load_dst.csv')
+        with open(TESTFILE, 'w') as csvfile:
+            csvfile.write(''.join([
+                '11/1/15 12:30:00 AM,1\n', '11/1/15 1:00:00 AM,2\n',
+                '11/1/15 1:30:00 AM,3\n', '11/1/15 1:00:00 AM,4\n',
+                '11/1/15 1:30:00 AM,5\n', '11/1/15 2:00:00 AM,6\n'
+            ]))
+        TEST_DF = read_data(TESTFILE, time_format='%m/%d/%y %I:%M:%S %p',
+                            tz='America/Chicago')
+        assert TEST_DF.index.is_monotonic_increasing
+        assert (TEST_DF['Duration'] == 60*30).all()
+        assert local_index(TEST_DF.index)[3].hour == 1
+        with open(TESTFILE, 'w') as csvfile:
+            csvfile.write(''.join([
+                '11/1/15 1:00:00 AM CDT,1\n', '11/1/15 1:30:00 AM CDT,2\n',
+                '11/1/15 1:00:00 AM CST,3\n', '11/1/15 1:30:00 AM CST,4\n'
+            ]))
+        TEST_DF = read_data(TESTFILE, tz='America/Chicago')
+        assert TEST_DF.index.is_monotonic_increasing
+        assert (TEST_DF['Duration'] == 60*30).all()
+        try:
+            read_data(TESTFILE)
+            raise AssertionError('mixed zone suffixes without tz')
+        except ValueError:
+            pass
+
+    # testing the zone suffix of the data file with and without time zone
+    TEST_DF = read_data('../dat/load.csv')
+    assert TEST_DF.index[0].utcoffset() == timedelta(hours=-6)
+    assert local_index(TEST_DF.index)[0] == pd.Timestamp('2014-12-31 23:30')
+    TEST_TZ_DF = read_data('../dat/load.csv', tz='America/Chicago')
+    assert str(TEST_TZ_DF.index.tz) == 'America/Chicago'
+    assert TEST_TZ_DF.index.tz_convert('UTC').equals(
+        TEST_DF.index.tz_convert('UTC')
+    )
+    assert pd.Timestamp('2015-03-08 03:00') in local_index(TEST_TZ_DF.index)
+    # zone suffixes after the last space only
+    TEST_TIMES = parse_times(pd.Series([
+        '1/1/15 12:00:00 AM CST ', '1/1/15 12:30:00 AM CST'
+    ]))
+    assert TEST_TIMES[1].utcoffset() == timedelta(hours=-6)
+    try:
+        parse_times(pd.Series(['1/1/15 12:00:00 AM AEST']))
+        raise AssertionError('unknown zone suffix')
+    except ValueError as err:
+        assert 'AEST' in str(err) and 'cannot be recognized' in str(err)
+    # no repeated hour in the data to infer the ambiguous times from
+    assert len(read_data(
+        '../dat/load.csv', time_format='%m/%d/%y %I:%M:%S %p CST',
+        tz='America/Chicago'
+    )) == len(TEST_DF)-2
+
+    # testing the durations around long gaps, changes of the sampling
+    # interval and repeated local hours
+    assert cal_durations(pd.DatetimeIndex([
+        '2015-01-01 00:00', '2015-01-01 00:30', '2015-01-03 01:00',
+        '2015-01-03 01:30'
+    ])).tolist() == [1800.0]*4
+    assert cal_durations(pd.DatetimeIndex([
+        '2015-11-01 01:00', '2015-11-01 01:30', '2015-11-01 01:00',
+        '2015-11-01 01:30'
+    ])).tolist() == [1800.0, 900.0, 900.0, 1800.0]
+    TEST_DURATIONS = cal_durations(pd.DatetimeIndex([
+        '2015-01-01 00:00', '2015-01-01 00:30', '2015-01-01 01:00',
+        '2015-01-01 01:30', '2015-01-01 02:30', '2015-01-01 03:30',
+        '2015-01-01 04:30'
+    ]))
+    assert TEST_DURATIONS.tolist() == [1800.0]*3+[2700.0]+[3600.0]*3
+    # the span and half of the first and the last gaps
+    assert TEST_DURATIONS.sum() == 4.5*3600+900+1800
+
     print('All functions in', os.path.basename(__file__), 'are ok')
@@ -13,9 +13,9 @@
 # import third party libraries
 
 # import user-defined modules
+from data_coverage import cal_coverage, export_coverage
 from data_read import read_data
-from plot_wkdyseries import dfhour_profile_plot
-from plot_histograms import histogram_plot
+from report_bundle import bundle_report, plan_report, render_report
 
 # global variables for plotting
 
@@ -23,8 +23,9 @@ from plot_histograms import histogram_plot
 # write functions
 def main_analyzer(datafilepath: str, foldername: str='./testplots',
                   header: int=None,
-                  time_format: str='%m/%d/%y %I:%M:%S %p CST',
-                  unit_name: str='kW'):
+                  time_format: str='%m/%d/%y %I:%M:%S %p %Z',
+                  unit_name: str='kW', coverage_path: str=None,
+                  tz: str=None, workers: int=1, report_path: str=None):
     """
         This function reads the data and put plots in the
         specified directory.
@@ -43,25 +44,48 @@ def main_analyzer(datafilepath: str, foldername: str='./testplots',
             will be combined into a MultiIndex. Default None
 
         time_format: string
-            format of string in time. Default '%m/%d/%y %I:%M:%S %p CST'
+            format of string in time. Default '%m/%d/%y %I:%M:%S %p %Z'
             Please check https://docs.python.org/3.5/library/datetime.html#strftime-and-strptime-behavior
-            for details
+            for details. A trailing %Z is a zone suffix, e.g. 'CST'
 
         unit_name: string
             unit of the data. Default 'kW'
+
+        coverage_path: string
+            path to the coverage report in csv or xlsx format. Default None
+            not to save the report
+
+        tz: string
+            time zone of the index of the data, e.g. 'America/Chicago'.
+            Default None to use the zone suffixes of the time stamps
+
+        workers: int
+            number of processes to make the diagrams. Default 1
+
+        report_path: string
+            path to the report bundling the diagrams and the coverage of
+            the data in html or pdf format. Default None not to make the
+            report
     """
 
-    pddf = read_data(datafilepath, header)
-    dfhour_profile_plot(pddf, foldername, col_name='CLG',
-                        y_label=''.join([
-                            'Instantaneous building cooling load [', unit_name,
-                            ']'
-                        ]),
-                        showfliers=True, diagram_types=['png'])
-    histogram_plot(pddf, foldername, col_name='CLG',
-                   xlabel_name='Building Cooling Load During Operating Hours',
-                   add_xlabel=''.join([' [', unit_name, ']']),
-                   diagram_types=['png'])
+    pddf = read_data(datafilepath, header, time_format=time_format, tz=tz)
+    coverage = cal_coverage(pddf)
+    # the box plots and the histograms are made together from the plan of
+    # the report
+    plan = plan_report(
+        pddf, foldername, coverage, col_name='CLG',
+        y_label=''.join([
+            'Instantaneous building cooling load [', unit_name, ']'
+        ]),
+        showfliers=True,
+        xlabel_name='Building Cooling Load During Operating Hours',
+        add_xlabel=''.join([' [', unit_name, ']']), diagram_types=['png']
+    )
+    render_report(pddf, plan, workers=workers)
+    if coverage_path is not None:
+        export_coverage(coverage, coverage_path)
+    if report_path is not None:
+        bundle_report(plan, coverage, report_path)
 
 
 # testing functions
@@ -71,16 +95,21 @@ if __name__ == '__main__':
     from pathlib import Path
     import shutil
 
-    if Path('../testplots').exists():
-        shutil.rmtree('../testplots')
-    main_analyzer('../dat/load.csv', '../testplots')
-    assert Path('../testplots/wkdy-load-profile-CLG-2015-01.png').exists()
-    assert Path('../testplots/wkdy-load-profile-CLG-2016-01.png').exists()
-    assert not Path('../testplots/wkdy-load-profile-CLG-2014-01.png').exists()
-    assert Path('../testplots/histogram-CLG-2015-overall.png').exists()
-    assert not Path('../testplots/histogram-CLG-2016-overall.png').exists()
-    assert not Path('../testplots/histogram-CLG-2014-overall.png').exists()
-    assert Path('../testplots/histogram-CLG-2016-01.png').exists()
+    FOLDER = os.environ.get('CLP_TEST_FOLDER', '../testplots')
+    if Path(FOLDER).exists():
+        shutil.rmtree(FOLDER)
+    main_analyzer('../dat/load.csv', FOLDER,
+                  coverage_path=os.path.join(FOLDER, 'coverage.csv'),
+                  report_path=os.path.join(FOLDER, 'report.html'))
+    assert Path(FOLDER, 'wkdy-load-profile-CLG-2015-01.png').exists()
+    assert Path(FOLDER, 'wkdy-load-profile-CLG-2016-01.png').exists()
+    assert not Path(FOLDER, 'wkdy-load-profile-CLG-2014-01.png').exists()
+    assert Path(FOLDER, 'histogram-CLG-2015-overall.png').exists()
+    assert not Path(FOLDER, 'histogram-CLG-2016-overall.png').exists()
+    assert not Path(FOLDER, 'histogram-CLG-2014-overall.png').exists()
+    assert Path(FOLDER, 'histogram-CLG-2016-01.png').exists()
+    assert Path(FOLDER, 'coverage.csv').exists()
+    assert Path(FOLDER, 'report.html').exists()
     print('All functions in', os.path.basename(__file__), 'are ok')
     print('Please delete plots in ../testplots/ upon completing inspection')
     
\ No newline at end of file
@@ -9,8 +9,12 @@
 
 # import python internal libraries
 from datetime import timedelta
+from functools import lru_cache
+import hashlib
 import itertools
+import json
 from math import isnan
+import os
 from os import mkdir
 from pathlib import Path
 
@@ -71,12 +75,131 @@ def savefig_for_file(filename: str, diagram_types: list=['pdf'],
     """
 
     for ext in diagram_types:
-        plt.savefig(
-            '.'.join([filename, ext]), dpi=300, format=ext, frameon=False
-        )
+        # write to a temporary file and rename it so that the file is
+        # either the old or the complete new diagram at any time
+        tmpname = ''.join([filename, '.', str(os.getpid()), '.tmp.', ext])
+        try:
+            plt.savefig(tmpname, dpi=300, format=ext, frameon=False)
+            os.replace(tmpname, '.'.join([filename, ext]))
+        finally:
+            if Path(tmpname).exists():
+                os.remove(tmpname)
     plt.clf()
 
 
+@lru_cache(maxsize=None)
+def _file_digest(filepath: str) -> bytes:
+    """
+        Hash of the content of a source file
+    """
+
+    return hashlib.sha256(Path(filepath).read_bytes()).digest()
+
+
+def fingerprint(data: list, params: list, source_files: list) -> str:
+    """
+        Function to calculate the fingerprint of a diagram from the data
+        slice, the plot parameters and the code making it. Diagrams with the
+        same fingerprint are the same.
+
+        Inputs:
+        ==========
+        data: list of pandas Series or DataFrame
+            data plotted in the diagram
+
+        params: list
+            plot parameters with a repr() that does not change between runs
+
+        source_files: list of str
+            paths to the python scripts making the diagram
+    """
+
+    sha = hashlib.sha256()
+    for dat in data:
+        sha.update(pd.util.hash_pandas_object(dat).values.tobytes())
+    sha.update(repr(params).encode())
+    sha.update(matplotlib.__version__.encode())
+    for filepath in [__file__]+source_files:
+        sha.update(_file_digest(os.path.realpath(filepath)))
+    return sha.hexdigest()
+
+
+def load_manifest(folder_path: str, name: str) -> dict:
+    """
+        Function to load the fingerprints of the diagrams saved in
+        folder_path. Returns an empty dictionary if there is none
+
+        Inputs:
+        ==========
+        folder_path: str
+            directory where the diagrams are saved
+
+        name: str
+            name of the manifest, e.g. name of the type of the diagrams
+    """
+
+    try:
+        with open(os.path.join(
+            folder_path, ''.join(['.fingerprints-', name, '.json'])
+        )) as jsonfile:
+            return json.load(jsonfile)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_manifest(manifest: dict, folder_path: str, name: str):
+    """
+        Function to save the fingerprints of the diagrams in folder_path by
+        writing to a temporary file and renaming it
+
+        Inputs:
+        ==========
+        manifest: dict
+            fingerprints with the file names of the diagrams without
+            extensions as the keys
+
+        folder_path: str
+            directory where the diagrams are saved
+
+        name: str
+            name of the manifest, e.g. name of the type of the diagrams
+    """
+
+    filename = os.path.join(
+        folder_path, ''.join(['.fingerprints-', name, '.json'])
+    )
+    tmpname = ''.join([filename, '.', str(os.getpid()), '.tmp'])
+    with open(tmpname, 'w') as jsonfile:
+        json.dump(manifest, jsonfile, indent=0, sort_keys=True)
+    os.replace(tmpname, filename)
+
+
+def is_unchanged(manifest: dict, filename: str, fprint: str,
+                 diagram_types: list) -> bool:
+    """
+        Function to check if the diagrams at filename with all the types
+        exist and have the same fingerprint in the manifest
+
+        Inputs:
+        ==========
+        manifest: dict
+            fingerprints loaded by load_manifest
+
+        filename: string
+            path to the file without extension as in savefig_for_file
+
+        fprint: str
+            fingerprint of the diagram to be made
+
+        diagram_types: list
+            types of diagrams to be saved
+    """
+
+    return manifest.get(os.path.basename(filename)) == fprint and all(
+        Path('.'.join([filename, ext])).exists() for ext in diagram_types
+    )
+
+
 def list_get_legend_handles_labels(list_of_axes: list):
     """
         Function to flatten list of handles and legends from AxesSubplot
@@ -101,7 +224,6 @@ def list_get_legend_handles_labels(list_of_axes: list):
 # testing functions
 if __name__ == '__main__':
 
-    import os
     import shutil
 
     # testing the make directory function mkdif_if_not_exist
@@ -109,4 +231,27 @@ if __name__ == '__main__':
     assert Path('./testtesttest/').exists()
     shutil.rmtree('./testtesttest/')
 
+    # testing the fingerprints and the manifest
+    import tempfile
+    TEST_SERIES = pd.Series([1.0, 2.0, 3.0])
+    FPRINT = fingerprint([TEST_SERIES], ['png'], [])
+    assert FPRINT == fingerprint([TEST_SERIES.copy()], ['png'], [])
+    assert FPRINT != fingerprint([TEST_SERIES*2.0], ['png'], [])
+    assert FPRINT != fingerprint([TEST_SERIES], ['pdf'], [])
+    with tempfile.TemporaryDirectory() as TMPDIR:
+        assert load_manifest(TMPDIR, 'test') == {}
+        FILENAME = os.path.join(TMPDIR, 'test')
+        plt.plot(TEST_SERIES)
+        savefig_for_file(FILENAME, ['png'])
+        save_manifest({'test': FPRINT}, TMPDIR, 'test')
+        assert is_unchanged(
+            load_manifest(TMPDIR, 'test'), FILENAME, FPRINT, ['png']
+        )
+        assert not is_unchanged(
+            load_manifest(TMPDIR, 'test'), FILENAME, FPRINT, ['png', 'pdf']
+        )
+        assert sorted(os.listdir(TMPDIR)) == [
+            '.fingerprints-test.json', 'test.png'
+        ]
+
     print('All functions in', os.path.basename(__file__), 'are ok')
@@ -9,8 +9,6 @@
 """
 
 # import python internal libraries
-import calendar
-from datetime import datetime, date
 from math import ceil
 import os
 
@@ -18,7 +16,11 @@ import os
 import matplotlib.pyplot as plt
 
 # import user-defined modules
-from plot_analysis import savefig_for_file, mkdir_if_not_exist
+from data_coverage import cal_coverage, period_rows, year_complete
+from data_read import local_index
+from plot_analysis import fingerprint, is_unchanged, load_manifest, \
+    mkdir_if_not_exist, save_manifest, savefig_for_file
+from shared_data import run_jobs
 
 # global variables for plotting
 
@@ -26,7 +28,8 @@ from plot_analysis import savefig_for_file, mkdir_if_not_exist
 # write functions
 def histogram_plot(df, folder_path, col_name='CLG',
                    xlabel_name='Building Load During Operating Hours',
-                   add_xlabel=' [-]', diagram_types=['pdf']):
+                   add_xlabel=' [-]', diagram_types=['pdf'], coverage=None,
+                   skip_unchanged=True, workers=1):
     """
         This function plots multiple histograms for the frequency of
         occurrence of cooling load for a combination of operating chillers
@@ -51,120 +54,169 @@ def histogram_plot(df, folder_path, col_name='CLG',
 
         diagram_types: list
             types of diagrams to be saved. Default ['pdf']
+
+        coverage: data_coverage.Coverage
+            coverage of the data calculated by data_coverage.cal_coverage.
+            Default None to calculate it here
+
+        skip_unchanged: bool
+            if diagrams should not be made again when the data, the plot
+            parameters and the code are the same as those of the existing
+            diagrams in folder_path. Default True
+
+        workers: int
+            number of processes to make the plots. The data are shared with
+            the processes through shared memory. Default 1 to plot in the
+            current process
     """
 
     # make directory if it is unavailable
     mkdir_if_not_exist(folder_path)
 
-    # individual plotting function
-    def _make_ind_plot(dat, duration, overall=False):
-        """
-            Make individual histogram plot based on the selected data and
-            the specified month and year.
-
-            Inputs:
-            ==========
-            dat: pandas Series
-                data to be plotted
-
-            duration: pandas Series
-                length of time per data point in hours
-
-            mn: string
-                name of month to be plotted
-
-            yr: int
-                year to be plotted
-
-            overall: bool
-                if the plot involves data in a year. Override mn
-        """
-
-        # start plotting
-        plt.figure(1)
-
-        # calculate the required limits and number of bins
-        max_dat = dat.max()
-        delta_dat = max((10**(len(str(int(max_dat)))-2))/4, 25)
-        bins = ceil(max_dat/delta_dat)
-
-        # plot primary axis, eliminate the first bar for non-operating hours
-        plt.hist(
-            dat, bins=bins-1, range=(delta_dat, bins*delta_dat),
-            weights=(duration/3600.0)
-        )
-        plt.grid(b=True, which='major', color='k', axis='y')
-        plt.grid(b=True, which='major', color='k', axis='x')
-
-        # y-axis label
-        plt.ylabel('Hours of operation')
-
-        # use the first timestamp to locate month and year
-        timestamp = dat.index[0]
-
-        # x-axis label
-        if overall:
-            plt.xlabel(''.join([
-                xlabel_name, ' in', ' ', str(timestamp.year), add_xlabel
-            ]))
-            # print and show figure
-            # move figure to hold everything in the diagram
-            plt.subplots_adjust(top=0.9, bottom=0.2, left=0.15, right=0.9)
-            savefig_for_file(''.join([
-                folder_path, '/', 'histogram-CLG-', str(timestamp.year),
-                '-overall'
-            ]), diagram_types)
-        else:
-            plt.xlabel(''.join([
-                xlabel_name, ' in ', timestamp.ctime()[4:7], ' ',
-                str(timestamp.year), add_xlabel
-            ]))
-            # print and show figure
-            # move figure to hold everything in the diagram
-            plt.subplots_adjust(top=0.9, bottom=0.2, left=0.15, right=0.9)
-            savefig_for_file(''.join([
-                folder_path, '/', 'histogram-CLG-', str(timestamp.year), '-',
-                '%02i' % timestamp.month
-            ]), diagram_types)
+    # fingerprints of the existing diagrams. All fingerprints are kept in
+    # the manifest but they are only compared with if required
+    manifest = load_manifest(folder_path, 'histogram')
+    known = manifest if skip_unchanged else {}
+
+    # start plotting. Only go through populated months
+    if coverage is None:
+        coverage = cal_coverage(df)
+    jobs = histogram_jobs(coverage)
+    kwargs = dict(
+        folder_path=folder_path, col_name=col_name, xlabel_name=xlabel_name,
+        add_xlabel=add_xlabel, diagram_types=diagram_types,
+        manifest=known
+    )
+    if workers > 1:
+        records = run_jobs(df, histogram_job, jobs, workers, **kwargs)
+    else:
+        records = [histogram_job(df, job, **kwargs) for job in jobs]
+    manifest.update(records)
+    save_manifest(manifest, folder_path, 'histogram')
+
+
+def histogram_jobs(coverage) -> list:
+    """
+        This function returns the list of histograms to be plotted as
+        tuples of (year, month, rows) for months with data for the entire
+        month, followed by (year, None, rows) for years with data for the
+        entire year, where rows is the tuple of the positions of the rows
+        of the period from data_coverage.period_rows.
 
-    # start plotting
-    yr_array = range(df.index[0].year, df.index[-1].year+1)
-    for yr in yr_array:
-        for mn in range(1, 13):
-            # select data within the same month
-            day_lim = calendar.monthrange(yr, mn)[1]
-            temp_df = df.loc[
-                datetime(yr, mn, 1, 0, 0):datetime(
-                    yr, mn, day_lim, 23, 59
-                ), :
-            ]
-            # check range an donly proceed if there are enough data for the
-            # entire month
-            try:
-                if not (
-                    temp_df.index[-1].date() == date(yr, mn, day_lim) and
-                    temp_df.index[0].date() == date(yr, mn, 1)
-                        ):
-                    continue
-            except IndexError:
-                continue
-
-            # make the plot with the selected data
-            _make_ind_plot(temp_df[col_name], temp_df['Duration'])
-
-        # make an overall plot for each year if data are complete
-        temp_df = df.loc[
-            datetime(yr, 1, 1, 0, 0):datetime(yr, 12, 31, 23, 59), :
+        Inputs:
+        ==========
+        coverage: data_coverage.Coverage
+            coverage of the data calculated by data_coverage.cal_coverage
+    """
+
+    return [
+        (yr, mn, period_rows(coverage, yr, mn))
+        for yr, mn in coverage.months.index
+        if coverage.months.loc[(yr, mn), 'Complete']
+    ]+[
+        (yr, None, period_rows(coverage, yr))
+        for yr in coverage.months.index.get_level_values('Year').unique()
+        if year_complete(coverage, yr)
+    ]
+
+
+def histogram_filename(folder_path, job) -> str:
+    """
+        This function returns the path to the histogram without extension.
+
+        Inputs:
+        ==========
+        folder_path: str
+            directory where the diagrams are saved
+
+        job: tuple
+            (year, month) of the histogram. Month is None for the histogram
+            of the entire year. It is followed by the rows of the period for
+            the jobs from histogram_jobs
+    """
+
+    yr, mn = job[:2]
+    if mn is None:
+        return ''.join([
+            folder_path, '/', 'histogram-CLG-', str(yr), '-overall'
+        ])
+    return ''.join([
+        folder_path, '/', 'histogram-CLG-', str(yr), '-', '%02i' % mn
+    ])
+
+
+def histogram_job(df, job, folder_path, col_name, xlabel_name, add_xlabel,
+                  diagram_types, manifest):
+    """
+        This function makes individual histogram plot of a month or a year
+        if it has changed. job is a tuple of (year, month, rows) from
+        histogram_jobs and month is None for the entire year. manifest is
+        the dictionary of the fingerprints from
+        plot_analysis.load_manifest. Returns a tuple of the file name and
+        the fingerprint of the diagram for the manifest. Other inputs are
+        the same as histogram_plot
+    """
+
+    # select data within the same month or year from its rows only
+    yr, mn, (start, stop) = job
+    overall = mn is None
+    rows_df = df.iloc[start:stop]
+    localind = local_index(rows_df.index)
+    if overall:
+        temp_df = rows_df.loc[localind.year == yr, :]
+    else:
+        temp_df = rows_df.loc[
+            (localind.year == yr) & (localind.month == mn), :
         ]
-        try:
-            if not (
-                temp_df.index[-1].date() == date(yr, 12, 31) and
-                temp_df.index[0].date() == date(yr, 1, 1)
-                    ):
-                continue
-        except IndexError:
-            continue
-        _make_ind_plot(temp_df[col_name], temp_df['Duration'], overall=True)
+    dat = temp_df[col_name]
+    duration = temp_df['Duration']
+
+    # skip the diagram if it is the same as the existing one
+    filename = histogram_filename(folder_path, job)
+    fprint = fingerprint(
+        [dat, duration],
+        [overall, xlabel_name, add_xlabel, diagram_types], [__file__]
+    )
+    if is_unchanged(manifest, filename, fprint, diagram_types):
+        return os.path.basename(filename), fprint
+
+    # start plotting
+    plt.figure(1)
+
+    # calculate the required limits and number of bins
+    max_dat = dat.max()
+    delta_dat = max((10**(len(str(int(max_dat)))-2))/4, 25)
+    bins = ceil(max_dat/delta_dat)
+
+    # plot primary axis, eliminate the first bar for non-operating hours
+    plt.hist(
+        dat, bins=bins-1, range=(delta_dat, bins*delta_dat),
+        weights=(duration/3600.0)
+    )
+    plt.grid(b=True, which='major', color='k', axis='y')
+    plt.grid(b=True, which='major', color='k', axis='x')
+
+    # y-axis label
+    plt.ylabel('Hours of operation')
+
+    # use the first timestamp to locate month and year
+    timestamp = dat.index[0]
+
+    # x-axis label
+    if overall:
+        plt.xlabel(''.join([
+            xlabel_name, ' in', ' ', str(timestamp.year), add_xlabel
+        ]))
+    else:
+        plt.xlabel(''.join([
+            xlabel_name, ' in ', timestamp.ctime()[4:7], ' ',
+            str(timestamp.year), add_xlabel
+        ]))
+    # print and show figure
+    # move figure to hold everything in the diagram
+    plt.subplots_adjust(top=0.9, bottom=0.2, left=0.15, right=0.9)
+    savefig_for_file(filename, diagram_types)
+    return os.path.basename(filename), fprint
 
 
 # testing functions
@@ -173,17 +225,32 @@ if __name__ == '__main__':
     from pathlib import Path
     import shutil
 
-    from data_read import read_data
+    from test_files import load_test_data
 
     # testing the dfhour_profile_plot. Can it plot?
-    PDDF = read_data('../dat/load.csv', header=None)
-    histogram_plot(PDDF, '../testplots', col_name='CLG',
+    FOLDER = os.environ.get('CLP_TEST_FOLDER', '../testplots')
+    PDDF = load_test_data()
+    histogram_plot(PDDF, FOLDER, col_name='CLG',
                    xlabel_name='Building Cooling Load During Operating Hours',
                    add_xlabel=' [kW]', diagram_types=['png'])
-    assert Path('../testplots/histogram-CLG-2015-overall.png').exists()
-    assert not Path('../testplots/histogram-CLG-2016-overall.png').exists()
-    assert not Path('../testplots/histogram-CLG-2014-overall.png').exists()
-    assert Path('../testplots/histogram-CLG-2016-01.png').exists()
+    assert Path(FOLDER, 'histogram-CLG-2015-overall.png').exists()
+    assert not Path(FOLDER, 'histogram-CLG-2016-overall.png').exists()
+    assert not Path(FOLDER, 'histogram-CLG-2014-overall.png').exists()
+    assert Path(FOLDER, 'histogram-CLG-2016-01.png').exists()
+
+    # fingerprints of the diagrams not made again are kept
+    histogram_plot(PDDF.iloc[-1000:, :], FOLDER, col_name='CLG',
+                   xlabel_name='Building Cooling Load During Operating Hours',
+                   add_xlabel=' [kW]', diagram_types=['png'],
+                   skip_unchanged=False)
+    assert 'histogram-CLG-2015-overall' in load_manifest(FOLDER, 'histogram')
+
+    # testing plotting in multiple processes
+    histogram_plot(PDDF, os.path.join(FOLDER, 'parallel'), col_name='CLG',
+                   xlabel_name='Building Cooling Load During Operating Hours',
+                   add_xlabel=' [kW]', diagram_types=['png'], workers=2)
+    assert Path(FOLDER, 'parallel', 'histogram-CLG-2015-overall.png').exists()
+    assert Path(FOLDER, 'parallel', 'histogram-CLG-2016-01.png').exists()
 
     print('All functions in', os.path.basename(__file__), 'are ok')
     print('Please delete plots in ../testplots/ upon completing inspection')
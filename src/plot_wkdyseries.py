@@ -9,7 +9,7 @@
 """
 
 # import libraries
-from datetime import datetime
+from datetime import date
 import os
 import pathlib
 import pdb
@@ -21,13 +21,24 @@ import pandas as pd
 import matplotlib.pyplot as plt
 
 # import user-defined libraries
-from plot_analysis import savefig_for_file, mkdir_if_not_exist
+from data_coverage import cal_coverage, day_type_keys, period_rows, \
+    slot_count
+from data_read import local_index
+from plot_analysis import fingerprint, is_unchanged, load_manifest, \
+    mkdir_if_not_exist, save_manifest, savefig_for_file
+from quantile_sketch import KLLSketch, box_stats, build_month_sketches, \
+    build_sketches, load_sketches, merge_sketches, replace_months, \
+    save_sketches
+from shared_data import run_jobs
 
 
 # write functions
 def dfhour_profile_plot(df, folder_path, col_name='CLG',
                         y_label='Instantaneous building load [kW]',
-                        showfliers=True, diagram_types=['png']):
+                        showfliers=True, diagram_types=['png'],
+                        coverage=None, workers=1, use_sketch=False,
+                        sketch_path=None, site='', sketch_k=200,
+                        sketch_merge=False, skip_unchanged=True):
     """
         This function plots the hourly kVA and kWh profiles of weekdays every
         month in terms of box plots
@@ -52,98 +63,325 @@ def dfhour_profile_plot(df, folder_path, col_name='CLG',
 
         diagram_types: list
             types of diagrams to be saved. Default ['pdf']
+
+        coverage: data_coverage.Coverage
+            coverage of the data calculated by data_coverage.cal_coverage.
+            Default None to calculate it here
+
+        workers: int
+            number of processes to make the plots. The data are shared with
+            the processes through shared memory. Default 1 to plot in the
+            current process
+
+        use_sketch: bool
+            if the box plots should be made from approximate quantiles of
+            quantile_sketch.KLLSketch kept for every (site, year, month, day
+            type, time slot) instead of all samples. The whiskers are
+            limited by the minimum and the maximum and outliers are not
+            shown. Please check quantile_sketch.py for the error bounds.
+            The sketches only take less memory than the samples for time
+            slots with many more than sketch_k samples. Default False
+
+        sketch_path: str
+            path to the file keeping the sketches between runs in sketch
+            mode. Box plots are made for all months of the site in the file.
+            Default None not to keep the sketches
+
+        sketch_merge: bool
+            if the sketches of df should be merged into those in
+            sketch_path, for data that do not overlap the data of earlier
+            runs, e.g. a month split into several files. Otherwise, the
+            sketches of a month in the file are replaced by those of df if
+            df has at least as many samples in the month, and the sketches
+            of a month of df with fewer samples are dropped so that running
+            the same data again does not count them twice. Default False
+
+        site: str
+            name of the site of the data in sketch mode. Default ''
+
+        sketch_k: int
+            parameter k of the sketches. Larger k gives smaller error.
+            Default 200
+
+        skip_unchanged: bool
+            if diagrams should not be made again when the data, the plot
+            parameters and the code are the same as those of the existing
+            diagrams in folder_path. Default True
     """
 
     # make directory if it is unavailable
     mkdir_if_not_exist(folder_path)
 
-    # prepare array of time
+    # prepare array of time in local time
+    times = profile_times(df)
+
+    # only go through populated months and skip plot if the size of data
+    # array is insufficient
+    if coverage is None:
+        coverage = cal_coverage(df)
+    # fingerprints of the existing diagrams. All fingerprints are kept in
+    # the manifest but they are only compared with if required
+    manifest = load_manifest(folder_path, 'wkdy')
+    known = manifest if skip_unchanged else {}
+    if use_sketch:
+        records = _sketch_profile_plot(
+            df, coverage, folder_path, times, col_name, y_label,
+            diagram_types, workers, sketch_path, site, sketch_k,
+            sketch_merge, known
+        )
+        manifest.update(records)
+        save_manifest(manifest, folder_path, 'wkdy')
+        return
+    jobs = profile_jobs(coverage, times)
+    kwargs = dict(
+        folder_path=folder_path, times=times, col_name=col_name,
+        y_label=y_label, showfliers=showfliers, diagram_types=diagram_types,
+        manifest=known
+    )
+    if workers > 1:
+        records = run_jobs(df, month_profile_plot, jobs, workers, **kwargs)
+    else:
+        records = [month_profile_plot(df, job, **kwargs) for job in jobs]
+    manifest.update(records)
+    save_manifest(manifest, folder_path, 'wkdy')
+
+
+def profile_times(df) -> list:
+    """
+        This function returns the list of datetime.time of the time slots
+        of a day in local time, starting from the time of the first data
+        point.
+
+        Inputs:
+        ==========
+        df: pandas DataFrame
+            hourly data of the BMS data with datetime object as its index
+    """
+
+    localind = local_index(df.index)
     times = []
-    times.append(df.index[0].time())
-    while df.index[len(times)].time() != times[0]:
-        times.append(df.index[len(times)].time())
+    times.append(localind[0].time())
+    while localind[len(times)].time() != times[0]:
+        times.append(localind[len(times)].time())
+    return times
+
+
+def profile_jobs(coverage, times) -> list:
+    """
+        This function returns the list of box plots to be plotted as tuples
+        of (year, month, day type, rows) for the months with enough data,
+        where rows is the tuple of the positions of the rows of the month
+        from data_coverage.period_rows.
+
+        Inputs:
+        ==========
+        coverage: data_coverage.Coverage
+            coverage of the data calculated by data_coverage.cal_coverage
+
+        times: list of datetime.time
+            time slots of a day from profile_times
+    """
+
+    return [
+        (yr, mn, load_type, period_rows(coverage, yr, mn))
+        for yr, mn in coverage.months.index
+        for load_type in ['wkdy']
+        if slot_count(coverage, yr, mn, load_type, times[0]) >= 27-8
+    ]
+
+
+def profile_filename(folder_path, col_name, job) -> str:
+    """
+        This function returns the path to the box plot of a day type in a
+        month without extension.
 
+        Inputs:
+        ==========
+        folder_path: str
+            directory where the diagrams are saved
+
+        col_name: str
+            column name of the variables to be plotted
+
+        job: tuple
+            (year, month, day type) of the box plot, followed by the rows
+            of the month for the jobs from profile_jobs
+    """
+
+    yr, mn, load_type = job[:3]
+    return ''.join([
+        folder_path, '/', load_type, '-load-profile-',
+        col_name, '-', '%04i' % yr, '-', '%02i' % mn
+    ])
+
+
+def month_profile_plot(df, job, folder_path, times, col_name, y_label,
+                       showfliers, diagram_types, manifest):
+    """
+        This function makes the box plot of a day type in a month if it has
+        changed. job is a tuple of (year, month, day type, rows) from
+        profile_jobs and manifest is the dictionary of the fingerprints
+        from plot_analysis.load_manifest. Returns a tuple of the file name
+        and the fingerprint of the diagram for the manifest. Other inputs
+        are the same as dfhour_profile_plot
+    """
+
+    yr, mn, load_type, (start, stop) = job
+    # initialize
+    data = []
+    # select data from the rows of the month only
+    max_value = 0.0
+    rows_df = df.iloc[start:stop]
+    localind = local_index(rows_df.index)
+    month_mask = (localind.year == yr) & (localind.month == mn)
+    month_df = rows_df.loc[month_mask, :]
+    # skip the diagram if it is the same as the existing one
+    filename = profile_filename(folder_path, col_name, job)
+    fprint = fingerprint(
+        [month_df[col_name]],
+        [job[:3], times, col_name, y_label, showfliers, diagram_types],
+        [__file__]
+    )
+    if is_unchanged(manifest, filename, fprint, diagram_types):
+        return os.path.basename(filename), fprint
+    # local time keys of the month calculated in bulk
+    month_ind = localind[month_mask]
+    day_mask = day_type_keys(month_ind) == load_type
+    slots = month_ind.time
+    for time in times:
+        data.append(
+            month_df.loc[day_mask & (slots == time), col_name]
+        )
+        max_value = max(max_value, data[-1].max())
+    _draw_profile_plot(data, max_value, job[:3], times, filename, y_label,
+                       showfliers, diagram_types)
+    return os.path.basename(filename), fprint
+
+
+def _sketch_profile_plot(df, coverage, folder_path, times, col_name, y_label,
+                         diagram_types, workers, sketch_path, site,
+                         sketch_k, sketch_merge, manifest):
+    """
+        Make the box plots from the sketches of the data. Returns a list of
+        tuples of the file names and the fingerprints of the diagrams for
+        the manifest. Inputs are the same as dfhour_profile_plot
+    """
+
+    # rebuild the sketches of the months in the data
+    if workers > 1:
+        new_store = merge_sketches(*run_jobs(
+            df, build_month_sketches, [
+                (yr, mn, period_rows(coverage, yr, mn))
+                for yr, mn in coverage.months.index
+            ], workers, col_name=col_name, site=site, k=sketch_k
+        ))
+    else:
+        new_store = build_sketches(df, col_name, site, sketch_k)
+    store = {} if sketch_path is None else load_sketches(sketch_path)
+    if sketch_merge:
+        store = merge_sketches(store, new_store)
+    else:
+        store = replace_months(store, new_store)
+    if sketch_path is not None:
+        save_sketches(store, sketch_path)
+
+    # skip plot if the number of samples is insufficient
+    jobs = sorted(set(
+        (yr, mn, load_type) for key_site, yr, mn, load_type, slot in store
+        if key_site == site and load_type == 'wkdy' and slot == times[0] and
+        store[(key_site, yr, mn, load_type, slot)].count >= 27-8
+    ))
+    records = []
+    for job in jobs:
+        yr, mn, load_type = job
+        sketches = [
+            store.get((site, yr, mn, load_type, time), KLLSketch(sketch_k))
+            for time in times
+        ]
+        stats = [box_stats(sketch) for sketch in sketches]
+        # skip the diagram if it is the same as the existing one
+        filename = profile_filename(folder_path, col_name, job)
+        fprint = fingerprint(
+            [], [job, times, col_name, y_label, diagram_types, stats, [
+                sketch.count for sketch in sketches
+            ]], [__file__]
+        )
+        records.append((os.path.basename(filename), fprint))
+        if is_unchanged(manifest, filename, fprint, diagram_types):
+            continue
+        _draw_profile_plot(
+            stats, max([0.0]+[
+                sketch.max for sketch in sketches if sketch.count > 0
+            ]), job, times, filename, y_label, False, diagram_types,
+            from_stats=True
+        )
+    return records
+
+
+def _draw_profile_plot(data, max_value, job, times, filename, y_label,
+                       showfliers, diagram_types, from_stats=False):
+    """
+        Draw and save the box plot of a day type in a month to filename.
+        data is a list of samples of each time slot, or a list of box plot
+        statistics for matplotlib.axes.Axes.bxp if from_stats is True.
+        Other inputs are the same as dfhour_profile_plot
+    """
+
+    yr, mn, load_type = job
     # use one plot as an example for now
     # random number for fig number
     fig_num = int(random.random()*1000.0)
-    yr_array = range(df.index[0].year, df.index[-1].year+1)
-    for yr in yr_array:
-        for mn in range(1, 13):
-            for load_type in ['wkdy']:
-                # initialize
-                data = []
-                # select data
-                max_value = 0.0
-                for time in times:
-                    data.append(
-                        df.loc[
-                            [
-                                (
-                                    dy.weekday() <= 4 if load_type == 'wkdy'
-                                    else dy.weekday() == (
-                                        5 if load_type == 'sat' else 6
-                                    )
-                                ) and dy.time() == time and
-                                dy.month == mn and dy.year == yr
-                                for dy in df.index
-                            ], col_name
-                        ]
-                    )
-                    max_value = max(max_value, data[-1].max())
-                # skip plot if the size of data array is insufficient
-                if len(data[0]) < 27-8:
-                    continue
-                # create box plot
-                plt.figure(mn*fig_num)
-                ax = plt.subplot(111)
-                plt.boxplot(data, labels=[
-                    time.strftime('%H:%M') if time.minute == 0 else ''
-                    for time in times
-                ], showfliers=showfliers)
-                # set axis label
-                timestamp = df.loc[[
-                    dy.month == mn for dy in df.index
-                ], :].index[0]
-                plt.xlabel(''.join([
-                    'Time on ', (
-                        'weekdays' if load_type == 'wkdy' else (
-                            'Saturdays' if load_type == 'sat' else 'Sundays'
-                        )
-                    ), ' in ', timestamp.ctime()[4:7], ' ', str(yr)
-                ]))
-                plt.ylabel(y_label)
-                # set minor grid line
-                minorLocator = MultipleLocator(
-                    (0.025 if max_value < 2.0 else 100)
-                    if max_value <= 2000.0 else 2.5*10**(
-                        len(str(int(max_value)))-2
-                    )
-                )
-                ax.yaxis.set_minor_locator(minorLocator)
-                majorLocator = MultipleLocator(
-                    (0.05 if max_value < 2.0 else 200)
-                    if max_value <= 2000.0 else 5.0*10**(
-                        len(str(int(max_value)))-2
-                    )
-                )
-                ax.yaxis.set_major_locator(majorLocator)
-                plt.grid(b=True, which='major', color='k', axis='y')
-                plt.grid(b=True, which='minor', color='k', axis='y')
-                # rotate x-axis labels
-                locs, labels = plt.xticks()
-                plt.setp(labels, rotation=90)
-                # create more space for x-axis labels
-                plt.subplots_adjust(top=0.95, bottom=0.2)
-                # set minimum for y-axis as zero
-                if max_value > 2.0:
-                    ax.set_ylim([0, None])
-                else:
-                    ax.set_ylim([0.8, 1.1])
-                # save plots
-                savefig_for_file(''.join([
-                   folder_path, '/', load_type, '-load-profile-',
-                   col_name, '-', '%04i' % yr, '-', '%02i' % mn
-                ]), diagram_types)
+    labels = [
+        time.strftime('%H:%M') if time.minute == 0 else ''
+        for time in times
+    ]
+    # create box plot
+    plt.figure(mn*fig_num)
+    ax = plt.subplot(111)
+    if from_stats:
+        for stats, label in zip(data, labels):
+            stats['label'] = label
+        ax.bxp(data, showfliers=showfliers)
+    else:
+        plt.boxplot(data, labels=labels, showfliers=showfliers)
+    # set axis label
+    plt.xlabel(''.join([
+        'Time on ', (
+            'weekdays' if load_type == 'wkdy' else (
+                'Saturdays' if load_type == 'sat' else 'Sundays'
+            )
+        ), ' in ', date(yr, mn, 1).ctime()[4:7], ' ', str(yr)
+    ]))
+    plt.ylabel(y_label)
+    # set minor grid line
+    minorLocator = MultipleLocator(
+        (0.025 if max_value < 2.0 else 100)
+        if max_value <= 2000.0 else 2.5*10**(
+            len(str(int(max_value)))-2
+        )
+    )
+    ax.yaxis.set_minor_locator(minorLocator)
+    majorLocator = MultipleLocator(
+        (0.05 if max_value < 2.0 else 200)
+        if max_value <= 2000.0 else 5.0*10**(
+            len(str(int(max_value)))-2
+        )
+    )
+    ax.yaxis.set_major_locator(majorLocator)
+    plt.grid(b=True, which='major', color='k', axis='y')
+    plt.grid(b=True, which='minor', color='k', axis='y')
+    # rotate x-axis labels
+    locs, labels = plt.xticks()
+    plt.setp(labels, rotation=90)
+    # create more space for x-axis labels
+    plt.subplots_adjust(top=0.95, bottom=0.2)
+    # set minimum for y-axis as zero
+    if max_value > 2.0:
+        ax.set_ylim([0, None])
+    else:
+        ax.set_ylim([0.8, 1.1])
+    # save plots
+    savefig_for_file(filename, diagram_types)
 
 
 # test functions
@@ -152,16 +390,49 @@ if __name__ == '__main__':
     from pathlib import Path
     import shutil
 
-    from data_read import read_data
+    from test_files import load_test_data
 
     # testing the dfhour_profile_plot. Can it plot?
-    PDDF = read_data('../dat/load.csv', header=None)
-    dfhour_profile_plot(PDDF, '../testplots', col_name='CLG',
+    FOLDER = os.environ.get('CLP_TEST_FOLDER', '../testplots')
+    PDDF = load_test_data()
+    dfhour_profile_plot(PDDF, FOLDER, col_name='CLG',
                         y_label='Instantaneous building cooling load [kW]',
                         showfliers=True, diagram_types=['png'])
-    assert Path('../testplots/wkdy-load-profile-CLG-2015-01.png').exists()
-    assert Path('../testplots/wkdy-load-profile-CLG-2016-01.png').exists()
-    assert not Path('../testplots/wkdy-load-profile-CLG-2014-01.png').exists()
+    assert Path(FOLDER, 'wkdy-load-profile-CLG-2015-01.png').exists()
+    assert Path(FOLDER, 'wkdy-load-profile-CLG-2016-01.png').exists()
+    assert not Path(FOLDER, 'wkdy-load-profile-CLG-2014-01.png').exists()
+
+    # testing plotting in multiple processes
+    dfhour_profile_plot(PDDF, os.path.join(FOLDER, 'parallel'),
+                        col_name='CLG',
+                        y_label='Instantaneous building cooling load [kW]',
+                        showfliers=True, diagram_types=['png'], workers=2)
+    assert Path(
+        FOLDER, 'parallel', 'wkdy-load-profile-CLG-2015-01.png'
+    ).exists()
+    assert Path(
+        FOLDER, 'parallel', 'wkdy-load-profile-CLG-2016-01.png'
+    ).exists()
+
+    # testing plotting from sketches kept between runs
+    dfhour_profile_plot(PDDF, os.path.join(FOLDER, 'sketch'), col_name='CLG',
+                        y_label='Instantaneous building cooling load [kW]',
+                        diagram_types=['png'], use_sketch=True,
+                        sketch_path=os.path.join(FOLDER, 'sketches.pkl'))
+    assert Path(FOLDER, 'sketch', 'wkdy-load-profile-CLG-2015-01.png').exists()
+    assert Path(FOLDER, 'sketches.pkl').exists()
+
+    # testing merging the sketches of data split within a month
+    for PART in [PDDF.iloc[:5000, :], PDDF.iloc[5000:, :]]:
+        dfhour_profile_plot(PART, os.path.join(FOLDER, 'sketch-merged'),
+                            diagram_types=['png'], use_sketch=True,
+                            sketch_path=os.path.join(FOLDER, 'sketches.pkl'),
+                            site='merged', sketch_merge=True)
+    assert sum(
+        sketch.count for key, sketch in load_sketches(
+            os.path.join(FOLDER, 'sketches.pkl')
+        ).items() if key[0] == 'merged'
+    ) == len(PDDF)
 
     print('All functions in', os.path.basename(__file__), 'are ok')
     print('Please delete plots in ../testplots/ upon completing inspection')
@@ -0,0 +1,430 @@
+#!/usr/bin/python3
+
+"""
+    This file contains a mergeable quantile sketch and the functions to keep
+    one sketch per (site, year, month, day type, time slot) so that box
+    plots can be made for histories too long to keep every sample in memory.
+
+    The sketch follows the KLL algorithm (Karnin, Lang and Liberty, 2016).
+    With k items kept at the top level, the difference between the rank of
+    an estimated quantile and the rank of the exact quantile is within
+    about 1.65% of the number of samples for k=200 with 99% confidence. The
+    error decreases roughly in proportion to 1/k while the memory of each
+    sketch grows in proportion to k. The minimum and maximum are exact.
+    Merging two sketches gives the same error bound as a single sketch fed
+    with all the samples, so sketches of data chunks can be built in
+    parallel and merged afterwards.
+
+    A sketch keeps every sample until its key has more than about k
+    samples, so sketches only save space for keys with many more than k
+    samples, e.g. years of 1-minute data in each (site, year, month, day
+    type, time slot). For fewer samples per key, a sketch takes a little
+    more space than the samples themselves.
+
+    Author: Howard Cheung (howard.at@gmail.com)
+    Date: 2017/04/08
+"""
+
+# import python internal libraries
+from math import ceil
+import os
+import pickle
+import random
+
+# import third party libraries
+from numpy import asarray, concatenate, cumsum, empty, full, isnan, \
+    searchsorted, sort
+import pandas as pd
+
+# import user-defined libraries
+from data_coverage import day_type_keys
+from data_read import local_index
+
+
+# global variables
+_COIN = random.Random(0)  # random coin of the compaction of all sketches
+
+
+# write classes and functions
+class KLLSketch(object):
+    """
+        Mergeable sketch for approximate quantiles of float samples. Only
+        k, the number of samples, the minimum, the maximum and the items of
+        each level are kept so that the sketch stays small when pickled.
+
+        Inputs:
+        ==========
+        k: int
+            number of items kept at the top level. Larger k gives smaller
+            error and more memory. Default 200
+    """
+
+    def __init__(self, k: int=200):
+        self.k = k
+        self.count = 0
+        self.min = float('nan')
+        self.max = float('nan')
+        self._levels = [empty(0)]
+
+    def _capacity(self, level: int) -> int:
+        """
+            Number of items that a level can hold before compaction
+        """
+        depth = len(self._levels)-level-1
+        return max(int(ceil(self.k*(2.0/3.0)**depth)), 2)
+
+    def _compress(self):
+        """
+            Compact the lowest full level until the sketch is within its
+            total capacity. Every compaction sorts the items of a level and
+            promotes every other item to the next level with double weight
+        """
+        while sum(len(items) for items in self._levels) > sum(
+            self._capacity(level) for level in range(len(self._levels))
+        ):
+            for level, items in enumerate(self._levels):
+                if len(items) >= self._capacity(level):
+                    break
+            if level == len(self._levels)-1:
+                self._levels.append(empty(0))
+            items = sort(self._levels[level])
+            # keep one item at the level if the number of items is odd
+            kept = items[:len(items) % 2]
+            items = items[len(items) % 2:]
+            self._levels[level] = kept
+            self._levels[level+1] = concatenate([
+                self._levels[level+1],
+                items[_COIN.randint(0, 1)::2]
+            ])
+
+    def update(self, value: float):
+        """
+            Add a sample to the sketch. nan is ignored
+        """
+        self.update_many([value])
+
+    def update_many(self, values):
+        """
+            Add an array of samples to the sketch. nan is ignored
+        """
+        values = asarray(values, dtype=float)
+        values = values[~isnan(values)]
+        if len(values) == 0:
+            return
+        self.min = min(values.min(), self.min) if self.count else \
+            values.min()
+        self.max = max(values.max(), self.max) if self.count else \
+            values.max()
+        self.count += len(values)
+        self._levels[0] = concatenate([self._levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        """
+            Add all samples summarized by another sketch with the same k to
+            this sketch. Returns this sketch
+        """
+        if other.k != self.k:
+            raise ValueError(''.join([
+                'Sketches with different k cannot be merged by ',
+                'KLLSketch.merge(). Exiting.......'
+            ]))
+        if other.count == 0:
+            return self
+        self.min = min(other.min, self.min) if self.count else other.min
+        self.max = max(other.max, self.max) if self.count else other.max
+        self.count += other.count
+        while len(self._levels) < len(other._levels):
+            self._levels.append(empty(0))
+        for level, items in enumerate(other._levels):
+            self._levels[level] = concatenate([self._levels[level], items])
+        self._compress()
+        return self
+
+    def quantile(self, q: float) -> float:
+        """
+            Estimated q-quantile of the samples with 0 <= q <= 1. nan if
+            the sketch is empty
+        """
+        if self.count == 0:
+            return float('nan')
+        if q <= 0.0:
+            return self.min
+        if q >= 1.0:
+            return self.max
+        values = concatenate(self._levels)
+        weights = concatenate([
+            full(len(items), 2**level)
+            for level, items in enumerate(self._levels)
+        ])
+        order = values.argsort()
+        ranks = cumsum(weights[order])
+        return values[order][min(
+            searchsorted(ranks, q*ranks[-1]), len(values)-1
+        )]
+
+
+def box_stats(sketch: KLLSketch, whis: float=1.5) -> dict:
+    """
+        This function returns the statistics of a box plot estimated from
+        the sketch in the format of matplotlib.axes.Axes.bxp. The whiskers
+        are at whis times the interquartile range from the quartiles but
+        within the minimum and the maximum. Outliers are not available from
+        sketches and the list of outliers is empty.
+
+        Inputs:
+        ==========
+        sketch: KLLSketch
+            sketch of the samples
+
+        whis: float
+            length of the whiskers as a multiple of the interquartile
+            range. Default 1.5
+    """
+
+    q1 = sketch.quantile(0.25)
+    q3 = sketch.quantile(0.75)
+    iqr = q3-q1
+    return {
+        'med': sketch.quantile(0.5), 'q1': q1, 'q3': q3,
+        'whislo': max(sketch.min, q1-whis*iqr),
+        'whishi': min(sketch.max, q3+whis*iqr), 'fliers': []
+    }
+
+
+def build_sketches(df: pd.DataFrame, col_name: str='CLG', site: str='',
+                   k: int=200) -> dict:
+    """
+        This function returns a dictionary of KLLSketch of the data with
+        keys of (site, year, month, day type, time slot). The day type is
+        'wkdy', 'sat' or 'sun' and the time slot is the datetime.time of the
+        time stamps in local time.
+
+        Inputs:
+        ==========
+        df: pandas DataFrame
+            data with datetime object as its index
+
+        col_name: str
+            column name of the variables to be summarized. Default 'CLG'
+
+        site: str
+            name of the site of the data. Default ''
+
+        k: int
+            parameter k of the sketches. Default 200
+    """
+
+    localind = local_index(df.index)
+    sketches = {}
+    for (yr, mn, load_type, slot), values in df[col_name].groupby([
+        localind.year, localind.month, day_type_keys(localind),
+        localind.time
+    ]):
+        sketch = KLLSketch(k)
+        sketch.update_many(values.values)
+        sketches[(site, yr, mn, load_type, slot)] = sketch
+    return sketches
+
+
+def build_month_sketches(df: pd.DataFrame, job: tuple, col_name: str='CLG',
+                         site: str='', k: int=200) -> dict:
+    """
+        This function returns the dictionary of sketches of build_sketches
+        for the data in a month only. It can be run in worker processes
+        by shared_data.run_jobs.
+
+        Inputs:
+        ==========
+        df: pandas DataFrame
+            data with datetime object as its index
+
+        job: tuple
+            year and month of the data to be summarized, and the tuple of
+            the positions of the rows of the month from
+            data_coverage.period_rows
+
+        col_name: str
+            column name of the variables to be summarized. Default 'CLG'
+
+        site: str
+            name of the site of the data. Default ''
+
+        k: int
+            parameter k of the sketches. Default 200
+    """
+
+    yr, mn, (start, stop) = job
+    rows_df = df.iloc[start:stop]
+    localind = local_index(rows_df.index)
+    return build_sketches(
+        rows_df.loc[(localind.year == yr) & (localind.month == mn), :],
+        col_name, site, k
+    )
+
+
+def merge_sketches(*stores) -> dict:
+    """
+        This function merges dictionaries of sketches from build_sketches.
+        Sketches with the same keys are merged. Returns a new dictionary
+        and the input sketches are not modified.
+
+        Inputs:
+        ==========
+        stores: dicts
+            dictionaries of sketches
+    """
+
+    merged = {}
+    for store in stores:
+        for key, sketch in store.items():
+            if key in merged:
+                merged[key].merge(sketch)
+            else:
+                merged[key] = KLLSketch(sketch.k).merge(sketch)
+    return merged
+
+
+def replace_months(store: dict, new_store: dict) -> dict:
+    """
+        This function returns a new dictionary of sketches with the
+        sketches of each (site, year, month) in store replaced by those in
+        new_store if new_store has at least as many samples in the month.
+        Thus running the same data again does not count the samples twice
+        and a data file with a part of a month does not replace the
+        sketches of the whole month. The sketches of a month in new_store
+        with fewer samples are dropped. Use merge_sketches instead for new
+        data that do not overlap the data of store.
+
+        Inputs:
+        ==========
+        store: dict
+            dictionary of sketches, e.g. loaded by load_sketches
+
+        new_store: dict
+            dictionary of sketches of new data
+    """
+
+    def _month_counts(sketches):
+        """
+            Number of samples in each (site, year, month)
+        """
+        counts = {}
+        for key, sketch in sketches.items():
+            counts[key[:3]] = counts.get(key[:3], 0)+sketch.count
+        return counts
+
+    old_counts = _month_counts(store)
+    new_counts = _month_counts(new_store)
+    replaced = set(
+        month for month, count in new_counts.items()
+        if count >= old_counts.get(month, 0)
+    )
+    merged = {
+        key: sketch for key, sketch in store.items()
+        if key[:3] not in replaced
+    }
+    merged.update({
+        key: sketch for key, sketch in new_store.items()
+        if key[:3] in replaced
+    })
+    return merged
+
+
+def save_sketches(store: dict, filename: str):
+    """
+        This function saves the dictionary of sketches to a file. The file
+        is written to a temporary file first and renamed so that an
+        interrupted run does not corrupt the saved sketches.
+
+        Inputs:
+        ==========
+        store: dict
+            dictionary of sketches
+
+        filename: string
+            path to the file
+    """
+
+    tmpname = ''.join([filename, '.tmp'])
+    with open(tmpname, 'wb') as pklfile:
+        pickle.dump(store, pklfile, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmpname, filename)
+
+
+def load_sketches(filename: str) -> dict:
+    """
+        This function loads the dictionary of sketches saved by
+        save_sketches. Returns an empty dictionary if the file does not
+        exist.
+
+        Inputs:
+        ==========
+        filename: string
+            path to the file
+    """
+
+    if not os.path.exists(filename):
+        return {}
+    with open(filename, 'rb') as pklfile:
+        return pickle.load(pklfile)
+
+
+# testing functions
+if __name__ == '__main__':
+
+    import tempfile
+
+    from numpy import arange
+    from numpy.random import RandomState
+
+    # testing the error bound of the sketch
+    SAMPLES = RandomState(0).lognormal(size=100000)
+    SKETCH = KLLSketch(200)
+    SKETCH.update_many(SAMPLES)
+    assert SKETCH.count == len(SAMPLES)
+    assert sum(len(items) for items in SKETCH._levels) < 1000
+    assert SKETCH.min == SAMPLES.min() and SKETCH.max == SAMPLES.max()
+    for Q in [0.05, 0.25, 0.5, 0.75, 0.95]:
+        assert abs(
+            (SAMPLES < SKETCH.quantile(Q)).mean()-Q
+        ) < 0.0165
+
+    # testing the merge of sketches of chunks
+    SKETCH_A = KLLSketch(200)
+    SKETCH_B = KLLSketch(200)
+    SKETCH_A.update_many(SAMPLES[:40000])
+    SKETCH_B.update_many(SAMPLES[40000:])
+    SKETCH_A.merge(SKETCH_B)
+    assert SKETCH_A.count == len(SAMPLES)
+    assert abs((SAMPLES < SKETCH_A.quantile(0.5)).mean()-0.5) < 0.0165
+
+    # exact for small number of samples
+    SKETCH = KLLSketch(200)
+    SKETCH.update_many(arange(1, 6))
+    assert box_stats(SKETCH)['med'] == 3.0
+
+    # testing the sketches of the data and their persistence
+    from test_files import load_test_data
+
+    PDDF = load_test_data()
+    STORE = build_sketches(PDDF, site='test')
+    assert sum(sketch.count for sketch in STORE.values()) == len(PDDF)
+    # few samples per key are kept as they are without large overheads
+    assert len(pickle.dumps(STORE)) < 4*PDDF['CLG'].values.nbytes
+    MERGED = merge_sketches(
+        build_sketches(PDDF.iloc[:5000, :], site='test'),
+        build_sketches(PDDF.iloc[5000:, :], site='test')
+    )
+    assert set(MERGED.keys()) == set(STORE.keys())
+    PARTIAL = replace_months(
+        STORE, build_sketches(PDDF.iloc[-100:, :], site='test')
+    )
+    assert sum(sketch.count for sketch in PARTIAL.values()) == len(PDDF)
+    with tempfile.TemporaryDirectory() as TMPDIR:
+        save_sketches(STORE, os.path.join(TMPDIR, 'sketches.pkl'))
+        LOADED = load_sketches(os.path.join(TMPDIR, 'sketches.pkl'))
+        assert set(LOADED.keys()) == set(STORE.keys())
+        assert load_sketches(os.path.join(TMPDIR, 'none.pkl')) == {}
+
+    print('All functions in', os.path.basename(__file__), 'are ok')
@@ -0,0 +1,478 @@
+#!/usr/bin/python3
+
+"""
+    This file contains functions that plan the diagrams and tables of a site
+    and bundle the diagrams made by the plotting functions into a single
+    HTML or PDF report with an index by year and month. The report is
+    written to the disk item by item so that only one diagram is kept in
+    memory at a time.
+
+    Author: Howard Cheung (howard.at@gmail.com)
+    Date: 2017/04/15
+"""
+
+# import python internal libraries
+from collections import namedtuple
+from datetime import date
+import html
+from math import ceil
+import os
+from pathlib import Path
+
+# import third party libraries
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
+
+# import user-defined libraries
+from data_coverage import cal_coverage
+from plot_analysis import load_manifest, mkdir_if_not_exist, save_manifest
+from plot_histograms import histogram_filename, histogram_job, \
+    histogram_jobs
+from plot_wkdyseries import month_profile_plot, profile_filename, \
+    profile_jobs, profile_times
+from shared_data import run_jobs
+
+
+# global variables
+ReportItem = namedtuple('ReportItem', [
+    'year', 'month', 'title', 'kind', 'job', 'filename'
+])
+ReportPlan = namedtuple('ReportPlan', ['folder_path', 'items', 'options'])
+REPORT_TYPE = 'png'  # type of the diagrams shown in the report
+PLOTTERS = {  # plotting functions of each kind of diagrams
+    'wkdy': month_profile_plot,
+    'histogram': histogram_job
+}
+LINES_PER_PAGE = 40  # lines of text on each page of the PDF report
+
+
+# write functions
+def plan_report(df, folder_path: str, coverage=None, col_name: str='CLG',
+                y_label: str='Instantaneous building load [kW]',
+                showfliers: bool=True,
+                xlabel_name: str='Building Load During Operating Hours',
+                add_xlabel: str=' [-]',
+                diagram_types: list=['png']) -> ReportPlan:
+    """
+        This function returns the ReportPlan of the box plots of
+        plot_wkdyseries and the histograms of plot_histograms of the data.
+        The items of the plan are the ReportItem of the diagrams ordered by
+        year and month with the diagrams of the entire year at the end of
+        the year. The month of the diagrams of the entire year is None. The
+        kind of the items is the key of the plotting function in PLOTTERS
+        and the options of the plan are the keyword arguments of the
+        plotting functions of each kind. The diagrams are made by
+        render_report and the file names of the items are the paths to the
+        files of type REPORT_TYPE shown in the report.
+
+        Inputs:
+        ==========
+        df: pandas DataFrame
+            data with datetime object as its index
+
+        folder_path: str
+            directory where the diagrams are saved
+
+        coverage: data_coverage.Coverage
+            coverage of the data calculated by data_coverage.cal_coverage.
+            Default None to calculate it here
+
+        col_name: str
+            column name of the variables to be plotted. Default 'CLG'
+
+        y_label: str
+            y-axis label of the box plots.
+            Default 'Instantaneous building load [kW]'
+
+        showfliers: bool
+            if the outliers are shown in the box plots. Default True
+
+        xlabel_name: str
+            text at the x-axis of the histograms.
+            Default 'Building Load During Operating Hours'
+
+        add_xlabel: str
+            additional string to be added in the x-axis label of the
+            histograms. Default ' [-]'
+
+        diagram_types: list
+            types of diagrams to be saved. REPORT_TYPE is added if it is
+            not in the list. Default ['png']
+    """
+
+    if coverage is None:
+        coverage = cal_coverage(df)
+    if REPORT_TYPE not in diagram_types:
+        diagram_types = diagram_types+[REPORT_TYPE]
+    times = profile_times(df)
+    options = {
+        'wkdy': dict(
+            folder_path=folder_path, times=times, col_name=col_name,
+            y_label=y_label, showfliers=showfliers,
+            diagram_types=diagram_types
+        ),
+        'histogram': dict(
+            folder_path=folder_path, col_name=col_name,
+            xlabel_name=xlabel_name, add_xlabel=add_xlabel,
+            diagram_types=diagram_types
+        )
+    }
+    items = []
+    for job in profile_jobs(coverage, times):
+        yr, mn, load_type = job[:3]
+        items.append((yr, mn, 0, ReportItem(
+            yr, mn, ''.join([
+                'Load profile on ', (
+                    'weekdays' if load_type == 'wkdy' else (
+                        'Saturdays' if load_type == 'sat' else 'Sundays'
+                    )
+                )
+            ]), 'wkdy', job, '.'.join([
+                profile_filename(folder_path, col_name, job), REPORT_TYPE
+            ])
+        )))
+    for job in histogram_jobs(coverage):
+        yr, mn = job[:2]
+        items.append((yr, 13 if mn is None else mn, 1, ReportItem(
+            yr, mn, 'Histogram of load', 'histogram', job, '.'.join([
+                histogram_filename(folder_path, job), REPORT_TYPE
+            ])
+        )))
+    return ReportPlan(folder_path, [
+        item for yr, mn, order, item in sorted(
+            items, key=lambda item: item[:3]
+        )
+    ], options)
+
+
+def _report_job(df, job, options: dict):
+    """
+        Make a diagram in the report. job is a tuple of the kind and the
+        job of the plotting function of the kind in PLOTTERS
+    """
+
+    kind, plot_job = job
+    return PLOTTERS[kind](df, plot_job, **options[kind])
+
+
+def render_report(df, plan: ReportPlan, workers: int=1,
+                  skip_unchanged: bool=True):
+    """
+        This function makes all the diagrams in the plan with one pool of
+        worker processes and updates the fingerprints of the diagrams in
+        the manifests of plot_wkdyseries.dfhour_profile_plot and
+        plot_histograms.histogram_plot.
+
+        Inputs:
+        ==========
+        df: pandas DataFrame
+            data with datetime object as its index
+
+        plan: ReportPlan
+            diagrams to be made from plan_report
+
+        workers: int
+            number of processes to make the diagrams. The data are shared
+            with the processes through shared memory. Default 1 to plot in
+            the current process
+
+        skip_unchanged: bool
+            if diagrams should not be made again when the data, the plot
+            parameters and the code are the same as those of the existing
+            diagrams in the folder of the plan. Default True
+    """
+
+    # make directory if it is unavailable
+    mkdir_if_not_exist(plan.folder_path)
+
+    # fingerprints of the existing diagrams. All fingerprints are kept in
+    # the manifest but they are only compared with if required
+    manifests = {
+        kind: load_manifest(plan.folder_path, kind) for kind in plan.options
+    }
+    options = {
+        kind: dict(
+            plan.options[kind],
+            manifest=manifests[kind] if skip_unchanged else {}
+        ) for kind in plan.options
+    }
+    jobs = [(item.kind, item.job) for item in plan.items]
+    if workers > 1:
+        records = run_jobs(df, _report_job, jobs, workers, options=options)
+    else:
+        records = [_report_job(df, job, options) for job in jobs]
+    for (kind, plot_job), (basename, fprint) in zip(jobs, records):
+        manifests[kind][basename] = fprint
+    for kind in manifests:
+        save_manifest(manifests[kind], plan.folder_path, kind)
+
+
+def _period_name(item: ReportItem) -> str:
+    """
+        Name of the month and year of the item, e.g. 'Jan 2015'
+    """
+
+    if item.month is None:
+        return ''.join(['Year ', str(item.year)])
+    return ''.join([
+        date(item.year, item.month, 1).ctime()[4:7], ' ', str(item.year)
+    ])
+
+
+def _check_items(items: list):
+    """
+        Raise an error if any diagram in the plan has not been made
+    """
+
+    for item in items:
+        if not os.path.exists(item.filename):
+            raise FileNotFoundError(''.join([
+                'The diagram ', item.filename, ' in the report cannot be ',
+                'found by report_bundle.bundle_report(). Exiting.......'
+            ]))
+
+
+def write_html(items: list, coverage, report_path: str,
+               title: str='Cooling load report'):
+    """
+        This function writes an HTML report with an index by year and
+        month, the coverage of the data and the diagrams. The diagrams are
+        linked with paths relative to the report.
+
+        Inputs:
+        ==========
+        items: list of ReportItem
+            diagrams in the report from the items of the plan of
+            plan_report
+
+        coverage: data_coverage.Coverage
+            coverage of the data calculated by data_coverage.cal_coverage
+
+        report_path: str
+            path to the HTML file
+
+        title: str
+            title of the report. Default 'Cooling load report'
+    """
+
+    report_dir = os.path.dirname(os.path.abspath(report_path))
+    tmpname = ''.join([report_path, '.', str(os.getpid()), '.tmp'])
+    # write to a temporary file and rename it so that the report is
+    # either the old or the complete new report at any time
+    try:
+        with open(tmpname, 'w') as htmlfile:
+            htmlfile.write(''.join([
+                '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n',
+                '<title>', html.escape(title), '</title>\n</head>\n<body>\n',
+                '<h1>', html.escape(title), '</h1>\n<h2>Index</h2>\n<ul>\n'
+            ]))
+            # index by year and month
+            periods = []
+            for item in items:
+                if (item.year, item.month) not in periods:
+                    periods.append((item.year, item.month))
+            for yr in sorted(set(yr for yr, mn in periods)):
+                htmlfile.write(''.join(['<li>', str(yr), ': ']))
+                htmlfile.write(', '.join([
+                    ''.join([
+                        '<a href="#', str(yr), '-', str(mn), '">',
+                        date(yr, mn, 1).ctime()[4:7] if mn is not None
+                        else 'Entire year', '</a>'
+                    ]) for item_yr, mn in periods if item_yr == yr
+                ]))
+                htmlfile.write('</li>\n')
+            htmlfile.write(
+                '<li><a href="#coverage">Data coverage</a></li>\n'
+            )
+            htmlfile.write('</ul>\n')
+
+            # diagrams
+            period = None
+            for item in items:
+                if (item.year, item.month) != period:
+                    period = (item.year, item.month)
+                    htmlfile.write(''.join([
+                        '<h2 id="', str(item.year), '-', str(item.month),
+                        '">', _period_name(item), '</h2>\n'
+                    ]))
+                htmlfile.write(''.join([
+                    '<h3>', html.escape(item.title), '</h3>\n<img src="',
+                    html.escape(os.path.relpath(
+                        os.path.abspath(item.filename), report_dir
+                    ).replace(os.sep, '/')), '" alt="',
+                    html.escape(item.title), '" style="max-width:100%">\n'
+                ]))
+
+            # coverage of the data
+            htmlfile.write('<h2 id="coverage">Data coverage</h2>\n')
+            htmlfile.write(coverage.months.to_html())
+            htmlfile.write('\n</body>\n</html>\n')
+        os.replace(tmpname, report_path)
+    finally:
+        if Path(tmpname).exists():
+            os.remove(tmpname)
+
+
+def _text_pages(pdf: PdfPages, title: str, lines: list):
+    """
+        Write lines of text to the PDF report in pages
+    """
+
+    for page in range(max(ceil(len(lines)/LINES_PER_PAGE), 1)):
+        fig = plt.figure(figsize=(8.27, 11.69))
+        fig.text(0.1, 0.95, title, fontsize=14, va='top')
+        for row, line in enumerate(
+            lines[page*LINES_PER_PAGE:(page+1)*LINES_PER_PAGE]
+        ):
+            fig.text(0.1, 0.9-row*0.02, line, fontsize=9, va='top',
+                     family='monospace')
+        pdf.savefig(fig)
+        plt.close(fig)
+
+
+def write_pdf(items: list, coverage, report_path: str,
+              title: str='Cooling load report'):
+    """
+        This function writes a multi-page PDF report with an index of the
+        page numbers by year and month, the coverage of the data and one
+        diagram per page.
+
+        Inputs:
+        ==========
+        items: list of ReportItem
+            diagrams in the report from the items of the plan of
+            plan_report
+
+        coverage: data_coverage.Coverage
+            coverage of the data calculated by data_coverage.cal_coverage
+
+        report_path: str
+            path to the PDF file
+
+        title: str
+            title of the report. Default 'Cooling load report'
+    """
+
+    coverage_lines = [
+        ''.join([
+            '%04i-%02i' % (yr, mn), '  ', '%8i' % row['Count'],
+            ' data points from ', str(row['First']), ' to ',
+            str(row['Last']), '' if row['Complete'] else '  (incomplete)'
+        ]) for (yr, mn), row in coverage.months.iterrows()
+    ]
+    index_pages = max(ceil((len(items)+1)/LINES_PER_PAGE), 1)
+    coverage_pages = max(ceil(len(coverage_lines)/LINES_PER_PAGE), 1)
+    index_lines = [
+        ''.join([
+            '%-12s' % _period_name(item), '%-32s' % item.title, 'page ',
+            str(index_pages+coverage_pages+ind+1)
+        ]) for ind, item in enumerate(items)
+    ]+[''.join(['%-44s' % 'Data coverage', 'page ', str(index_pages+1)])]
+
+    tmpname = ''.join([report_path, '.', str(os.getpid()), '.tmp'])
+    try:
+        with PdfPages(tmpname) as pdf:
+            _text_pages(pdf, title, index_lines)
+            _text_pages(pdf, 'Data coverage', coverage_lines)
+            for item in items:
+                fig = plt.figure(figsize=(11.69, 8.27))
+                ax = fig.add_axes([0.0, 0.0, 1.0, 0.93])
+                ax.imshow(plt.imread(item.filename))
+                ax.axis('off')
+                fig.text(0.02, 0.97, ''.join([
+                    _period_name(item), ': ', item.title
+                ]), fontsize=12, va='top')
+                pdf.savefig(fig)
+                plt.close(fig)
+        os.replace(tmpname, report_path)
+    finally:
+        if Path(tmpname).exists():
+            os.remove(tmpname)
+
+
+def bundle_report(plan: ReportPlan, coverage, report_path: str,
+                  title: str='Cooling load report'):
+    """
+        This function bundles the diagrams in the plan made by
+        render_report into an HTML report if report_path ends with .html
+        or .htm, or a PDF report if it ends with .pdf.
+
+        Inputs:
+        ==========
+        plan: ReportPlan
+            diagrams in the report from plan_report
+
+        coverage: data_coverage.Coverage
+            coverage of the data calculated by data_coverage.cal_coverage
+
+        report_path: str
+            path to the report
+
+        title: str
+            title of the report. Default 'Cooling load report'
+    """
+
+    _check_items(plan.items)
+    ext = report_path.split('.')[-1]
+    if ext == 'html' or ext == 'htm':
+        write_html(plan.items, coverage, report_path, title)
+    elif ext == 'pdf':
+        write_pdf(plan.items, coverage, report_path, title)
+    else:
+        raise ValueError(''.join([
+            'The file extension of the report cannot be recognized by ',
+            'report_bundle.bundle_report(). Exiting.......'
+        ]))
+
+
+# testing functions
+if __name__ == '__main__':
+
+    from data_coverage import period_rows
+    from test_files import load_test_data
+
+    FOLDER = os.environ.get('CLP_TEST_FOLDER', '../testplots')
+    PDDF = load_test_data()
+    COVERAGE = cal_coverage(PDDF)
+    PLAN = plan_report(PDDF, FOLDER, COVERAGE, diagram_types=['pdf'])
+    ITEMS = PLAN.items
+    assert ITEMS[0] == ReportItem(
+        2015, 1, 'Load profile on weekdays', 'wkdy',
+        (2015, 1, 'wkdy', period_rows(COVERAGE, 2015, 1)),
+        ''.join([FOLDER, '/wkdy-load-profile-CLG-2015-01.png'])
+    )
+    assert ITEMS[1].title == 'Histogram of load'
+    assert ITEMS[-1].filename == ''.join([
+        FOLDER, '/histogram-CLG-2016-01.png'
+    ])
+    assert len(ITEMS) == 13+14
+    assert PLAN.options['wkdy']['diagram_types'] == ['pdf', 'png']
+
+    # the diagrams in the report are made in one pool from the plan
+    render_report(PDDF, PLAN, workers=2)
+    assert all(
+        Path(item.filename[:-4]+'.pdf').exists() for item in ITEMS
+    )
+    assert len(load_manifest(FOLDER, 'wkdy')) >= 13
+    assert 'histogram-CLG-2015-overall' in load_manifest(FOLDER, 'histogram')
+    bundle_report(PLAN, COVERAGE, os.path.join(FOLDER, 'report.html'))
+    bundle_report(PLAN, COVERAGE, os.path.join(FOLDER, 'report.pdf'))
+    assert Path(FOLDER, 'report.html').exists()
+    assert Path(FOLDER, 'report.pdf').exists()
+
+    # no temporary file is left if the report cannot be written
+    BAD_ITEM = ITEMS[0]._replace(filename=os.path.join(
+        FOLDER, '.fingerprints-wkdy.json'
+    ))
+    try:
+        write_pdf([BAD_ITEM], COVERAGE, os.path.join(FOLDER, 'bad.pdf'))
+        raise AssertionError('write_pdf() should fail for a non-image file')
+    except (OSError, ValueError, SyntaxError):
+        pass
+    assert not Path(FOLDER, 'bad.pdf').exists()
+    assert not [
+        name for name in os.listdir(FOLDER) if name.endswith('.tmp')
+    ]
+
+    print('All functions in', os.path.basename(__file__), 'are ok')
+    print('Please delete plots in ../testplots/ upon completing inspection')
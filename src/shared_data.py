@@ -0,0 +1,202 @@
+#!/usr/bin/python3
+
+"""
+    This file contains functions that place the data read by
+    data_read.read_data in shared memory once so that plotting jobs in
+    worker processes can attach to it without copying. Only the small
+    descriptor of the shared memory and the job descriptors are sent to the
+    workers.
+
+    Requires Python 3.8 or above for multiprocessing.shared_memory.
+
+    Author: Howard Cheung (howard.at@gmail.com)
+    Date: 2017/04/01
+"""
+
+# import python internal libraries
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+import os
+
+# import third party libraries
+from numpy import datetime_data, dtype, float64, int64, ndarray
+import pandas as pd
+
+# import user-defined libraries
+
+
+# global variables
+SharedFrame = namedtuple(
+    'SharedFrame',
+    ['name', 'length', 'columns', 'index_name', 'index_dtype', 'tz']
+)
+_WORKER_DATA = {}  # shared memory and dataframe attached by each worker
+
+
+# write functions
+def share_frame(df: pd.DataFrame) -> tuple:
+    """
+        This function copies the index and the numeric columns of the
+        dataframe into a new block of shared memory. Returns a tuple of the
+        SharedMemory object and the SharedFrame descriptor for attach_frame.
+        The caller should close and unlink the shared memory when the
+        workers are done.
+
+        The block holds the time stamps as int64 in UTC in the resolution
+        of the index followed by the columns as a float64 array in
+        row-major order.
+
+        Inputs:
+        ==========
+        df: pandas DataFrame
+            data with datetime object as its index and float columns
+    """
+
+    length = len(df)
+    ncol = len(df.columns)
+    shm = SharedMemory(
+        create=True, size=max(length*8*(1+ncol), 1)
+    )
+    index = ndarray((length, ), dtype=int64, buffer=shm.buf)
+    index[:] = df.index.values.view(int64)
+    values = ndarray((length, ncol), dtype=float64, buffer=shm.buf,
+                     offset=length*8)
+    values[:] = df.values
+    return shm, SharedFrame(
+        shm.name, length, list(df.columns), df.index.name,
+        df.index.values.dtype.str, df.index.tz
+    )
+
+
+def attach_frame(desc: SharedFrame) -> tuple:
+    """
+        This function attaches to the shared memory created by share_frame
+        and returns a tuple of the SharedMemory object and a dataframe
+        viewing the shared memory without copying. The SharedMemory object
+        should be kept alive as long as the dataframe is used.
+
+        Inputs:
+        ==========
+        desc: SharedFrame
+            descriptor of the shared memory returned by share_frame
+    """
+
+    try:
+        shm = SharedMemory(name=desc.name, track=False)
+    except TypeError:  # track is only available from Python 3.13
+        shm = SharedMemory(name=desc.name)
+    # the time stamps in UTC are viewed in the time zone without conversion
+    index_dtype = dtype(desc.index_dtype)
+    index = pd.DatetimeIndex(
+        ndarray((desc.length, ), dtype=int64, buffer=shm.buf),
+        dtype=index_dtype if desc.tz is None else pd.DatetimeTZDtype(
+            datetime_data(index_dtype)[0], desc.tz
+        ), name=desc.index_name, copy=False
+    )
+    values = ndarray((desc.length, len(desc.columns)), dtype=float64,
+                     buffer=shm.buf, offset=desc.length*8)
+    return shm, pd.DataFrame(
+        values, index=index, columns=desc.columns, copy=False
+    )
+
+
+def _init_worker(desc: SharedFrame):
+    """
+        Attach the worker process to the shared dataframe
+    """
+
+    _WORKER_DATA['shm'], _WORKER_DATA['df'] = attach_frame(desc)
+
+
+def _run_job(func, job, kwargs: dict):
+    """
+        Run a plotting job on the shared dataframe in the worker process
+    """
+
+    return func(_WORKER_DATA['df'], job, **kwargs)
+
+
+def run_jobs(df: pd.DataFrame, func, jobs: list, workers: int=None,
+             **kwargs) -> list:
+    """
+        This function runs func(df, job, **kwargs) for every job in jobs in
+        worker processes sharing a single copy of df. Returns the list of
+        results in the order of jobs.
+
+        Inputs:
+        ==========
+        df: pandas DataFrame
+            data with datetime object as its index and float columns
+
+        func: function
+            function defined at the top level of a module so that it can
+            be sent to the workers. It takes the dataframe, a job
+            descriptor and the keyword arguments
+
+        jobs: list
+            job descriptors, e.g. tuples of (year, month, day type)
+
+        workers: int
+            number of worker processes. Default None to use the number of
+            processors in the machine
+
+        kwargs: keyword arguments
+            fixed arguments for func that are sent to the workers
+    """
+
+    if not jobs:
+        return []
+    shm, desc = share_frame(df)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=min(workers or os.cpu_count(), len(jobs)),
+            initializer=_init_worker, initargs=(desc, )
+        ) as executor:
+            return list(executor.map(
+                _run_job, [func]*len(jobs), jobs, [kwargs]*len(jobs)
+            ))
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _job_sum(df, job, col_name='CLG'):
+    """
+        Testing job summing a column within a year and a month
+    """
+
+    yr, mn = job
+    return df.loc[
+        (df.index.year == yr) & (df.index.month == mn), col_name
+    ].sum()
+
+
+# testing functions
+if __name__ == '__main__':
+
+    from numpy import shares_memory
+
+    from test_files import load_test_data
+
+    PDDF = load_test_data()
+    SHM, DESC = share_frame(PDDF)
+    SHM_VIEW, SHARED_DF = attach_frame(DESC)
+    assert SHARED_DF.index.equals(PDDF.index)
+    assert SHARED_DF.equals(PDDF)
+    # the index is a view of the shared memory
+    assert shares_memory(
+        SHARED_DF.index.asi8, ndarray((DESC.length, ), dtype=int64,
+                                      buffer=SHM_VIEW.buf)
+    )
+    del SHARED_DF
+    SHM_VIEW.close()
+    SHM.close()
+    SHM.unlink()
+
+    JOBS = [(2015, mn) for mn in range(1, 13)]
+    assert run_jobs(PDDF, _job_sum, JOBS, workers=2) == [
+        _job_sum(PDDF, job) for job in JOBS
+    ]
+
+    print('All functions in', os.path.basename(__file__), 'are ok')
@@ -4,44 +4,259 @@
     This file contains functions that test all files in the src folder.
     Including running pep8 and the main function in the script.
 
+    The scripts are run in parallel. Each script gets its own output folder
+    through the environment variable CLP_TEST_FOLDER so that scripts plotting
+    diagrams do not overwrite each other, and the test data file is read and
+    preprocessed once and shared with all scripts through a pickle file given
+    by the environment variable CLP_TEST_DATA. Plots produced by the scripts
+    are compared with the golden images in ../img/golden/<script>/, where
+    <script> is the name of the script without extension. A test fails if
+    a plot has no golden image or a golden image is no longer plotted.
+
+    The golden images depend on the versions of matplotlib and its fonts
+    and are not included in the repository. Run
+    'python test_files.py --update-golden' once in the environment of the
+    project after inspecting the plots, and commit ../img/golden/ so that
+    later changes are compared with them. Run
+    'python test_files.py --skip-golden' to test the scripts without the
+    comparison, e.g. in other environments.
+
     Author: Howard Cheung (howard.at@gmail.com)
     Date: 2017/03/12
 """
 
 # import python internal libraries
+from concurrent.futures import ThreadPoolExecutor
 import glob
 import os
-from subprocess import call
+from pathlib import Path
+import shutil
+from subprocess import PIPE, STDOUT, run
+import sys
+import tempfile
 
 # import third party libraries
+import pandas as pd
 
 # import user-defined libraries
+from data_read import read_data
+
+
+# global variables for testing
+GOLDEN_DIR = '../img/golden'
+TEST_DATA = '../dat/load.csv'
 
 
 # define new functions
-def test_scripts(directory: str) -> None:
+def prepare_test_data(filename: str, folder_path: str) -> str:
+    """
+        This function reads and preprocesses the test data file once and
+        saves the resulting dataframe as a pickle file in folder_path so
+        that all scripts under test can share it. Returns the path to the
+        pickle file.
+
+        Inputs:
+        ==========
+        filename: string
+            path to the data file
+
+        folder_path: string
+            directory where the pickle file is saved
+    """
+
+    pklpath = os.path.join(folder_path, 'test_data.pkl')
+    read_data(filename, header=None).to_pickle(pklpath)
+    return pklpath
+
+
+def run_script(file: str, folder_path: str, datapath: str) -> tuple:
     """
-        This function tests all python scripts in the specfied directory.
+        This function runs pep8 and the testing functions of a python script
+        with its own output folder. Returns a tuple of the file name, the
+        return code of the script and the collected console output.
+
+        Inputs:
+        ==========
+        file: string
+            path to the python script
+
+        folder_path: string
+            directory where the diagrams of the script are saved
+
+        datapath: string
+            path to the shared preprocessed test data
+    """
+
+    env = dict(os.environ, CLP_TEST_FOLDER=folder_path,
+               CLP_TEST_DATA=datapath, MPLBACKEND='Agg')
+    cwd = os.path.dirname(os.path.realpath(file))
+    style = run(['pep8', file], stdout=PIPE, stderr=STDOUT,
+                universal_newlines=True, cwd=cwd)
+    script = run([sys.executable, os.path.basename(file)], stdout=PIPE,
+                 stderr=STDOUT, universal_newlines=True, cwd=cwd, env=env)
+    return file, script.returncode, ''.join([style.stdout, script.stdout])
+
+
+def compare_golden(folder_path: str, golden_dir: str,
+                   tol: float=2.0, update: bool=False) -> list:
+    """
+        This function compares all png files in folder_path and its
+        subfolders with the files of the same relative paths in golden_dir.
+        Returns a list of error messages for images that differ by more than
+        the tolerance, images without a golden counterpart and golden images
+        without an image under test.
+
+        Inputs:
+        ==========
+        folder_path: string
+            directory where the diagrams under test are saved
+
+        golden_dir: string
+            directory of the golden images of the script under test, e.g.
+            '../img/golden/plot_histograms'
+
+        tol: float
+            tolerance of the root mean square difference of the pixel
+            values in the range of 0 to 255. Default 2.0
+
+        update: bool
+            if the golden images should be overwritten by the diagrams
+            under test instead of being compared with. Default False
+    """
+
+    from matplotlib.testing.compare import compare_images
+
+    actuals = [
+        os.path.relpath(actual, folder_path) for actual in glob.glob(
+            os.path.join(folder_path, '**', '*.png'), recursive=True
+        )
+    ]
+    expecteds = [
+        os.path.relpath(expected, golden_dir) for expected in glob.glob(
+            os.path.join(golden_dir, '**', '*.png'), recursive=True
+        )
+    ]
+    if update:
+        if Path(golden_dir).exists():
+            shutil.rmtree(golden_dir)
+        for name in actuals:
+            expected = os.path.join(golden_dir, name)
+            Path(expected).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(os.path.join(folder_path, name), expected)
+        return []
+
+    errors = []
+    for name in sorted(set(actuals) | set(expecteds)):
+        actual = os.path.join(folder_path, name)
+        expected = os.path.join(golden_dir, name)
+        if name not in expecteds:
+            errors.append(''.join([
+                'The golden image ', expected, ' cannot be found. Run ',
+                "'python test_files.py --update-golden' to create it"
+            ]))
+        elif name not in actuals:
+            errors.append(''.join([
+                'The golden image ', expected, ' is not plotted anymore'
+            ]))
+        else:
+            err = compare_images(expected, actual, tol)
+            if err is not None:
+                errors.append(err)
+    return errors
+
+
+def load_test_data(filename: str=TEST_DATA) -> pd.DataFrame:
+    """
+        This function returns the test data for the testing functions of
+        the scripts. The dataframe shared by test_scripts through the
+        environment variable CLP_TEST_DATA is loaded if it is set.
+        Otherwise, the data file is read by data_read.read_data.
+
+        Inputs:
+        ==========
+        filename: string
+            path to the data file if CLP_TEST_DATA is not set. Default
+            '../dat/load.csv'
+    """
+
+    datapath = os.environ.get('CLP_TEST_DATA')
+    if datapath is None:
+        return read_data(filename, header=None)
+    return pd.read_pickle(datapath)
+
+
+def test_scripts(directory: str, workers: int=None, tol: float=2.0,
+                 update_golden: bool=False, skip_golden: bool=False) -> bool:
+    """
+        This function tests all python scripts in the specfied directory
+        in parallel. Returns True if all tests pass.
 
         Inputs:
         ==========
         directory: string
             path to the directory
+
+        workers: int
+            number of scripts to be run at the same time. Default None
+            to use the number of processors in the machine
+
+        tol: float
+            tolerance of the golden image comparison. Default 2.0
+
+        update_golden: bool
+            if the golden images should be replaced by the new plots.
+            Default False
+
+        skip_golden: bool
+            if the plots should not be compared with the golden images.
+            Default False
     """
 
     # fix the directory name is it is not good
     if directory[-1] != '\\' and directory[-1] != '/':
         directory = ''.join([directory, '/'])
     # get all python file in the directory, and do not test the current file
-    for file in glob.glob(''.join([directory, '*.py'])):
-        if os.path.realpath(file) != os.path.realpath(__file__) and (
-            file.endswith(".py")
-        ):
-            print('Testing ', file)
-            call(['pep8', file])
-            call(['python', file])
+    files = [
+        file for file in sorted(glob.glob(''.join([directory, '*.py'])))
+        if os.path.realpath(file) != os.path.realpath(__file__)
+    ]
+
+    passed = True
+    with tempfile.TemporaryDirectory() as tmpdir:
+        datapath = prepare_test_data(TEST_DATA, tmpdir)
+        folders = [
+            os.path.join(tmpdir, os.path.splitext(os.path.basename(file))[0])
+            for file in files
+        ]
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as \
+                executor:
+            results = executor.map(
+                run_script, files, folders, [datapath]*len(files)
+            )
+            # report in the order of the files for reproducible output
+            for (file, returncode, output), folder in zip(results, folders):
+                print('Testing ', file)
+                print(output, end='')
+                if skip_golden:
+                    errors = []
+                else:
+                    errors = compare_golden(
+                        folder,
+                        os.path.join(GOLDEN_DIR, os.path.basename(folder)),
+                        tol=tol, update=update_golden
+                    )
+                for err in errors:
+                    print(err)
+                if returncode != 0 or errors:
+                    passed = False
+                    print('Test failed for ', file)
+    if skip_golden:
+        print('The plots are not compared with the golden images')
+    return passed
 
 # testing functions
 if __name__ == '__main__':
 
-    test_scripts('.')
+    if not test_scripts('.', update_golden='--update-golden' in sys.argv,
+                        skip_golden='--skip-golden' in sys.argv):
+        sys.exit(1)